@@ -0,0 +1,107 @@
+# admin_warmup.py
+"""
+Background warm-up of the admin-only stacks.
+
+The public pages import only streamlit, the city store and the public bundle;
+the Drive client (googleapiclient), the PDF stack (fpdf, pypdf), the Excel
+writers and the pandas-based engines are imported lazily by the admin code.
+start() imports them once per process in a daemon thread as soon as an admin
+session opens, so the first admin action does not pay for the imports (and the
+Drive client build) inside a rerun.
+"""
+import time
+import threading
+import importlib
+
+# Import order: shared libraries first, then the app modules that sit on top of them.
+ADMIN_MODULES = [
+    "pandas",
+    "plotly.express",
+    "googleapiclient.discovery",
+    "googleapiclient.http",
+    "fpdf",
+    "pypdf",
+    "openpyxl",
+    "xlsxwriter",
+    "gdrive_auth",
+    "drive_sync",
+    "drive_upload",
+    "drive_download",
+    "state_drive",
+    "upload_pipeline",
+    "document_upload",
+    "emissions_engine",
+    "ghg_inventory",
+    "projection_engine",
+    "city_table",
+    "figure_cache",
+    "export_city_files",
+    "cap_report",
+    "excel_export",
+]
+
+_lock = threading.Lock()
+_started = False
+_done = threading.Event()
+_status = {"started_at": None, "seconds": None, "modules": {}, "errors": {}, "drive_client": None}
+
+def _import_all(modules):
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            _status["modules"][name] = round(time.perf_counter() - t0, 3)
+        except Exception as e:
+            # a missing optional stack only disables the feature that needs it
+            _status["errors"][name] = f"{type(e).__name__}: {e}"
+
+def _build_drive_client():
+    try:
+        from gdrive_auth import get_drive_service
+        t0 = time.perf_counter()
+        get_drive_service()
+        _status["drive_client"] = round(time.perf_counter() - t0, 3)
+    except Exception as e:
+        _status["errors"]["drive_client"] = f"{type(e).__name__}: {e}"
+
+def start(modules=None, drive_client=True):
+    """
+    Import the admin stacks (and build the Drive client) in a background thread, once per process.
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    def run():
+        t0 = time.perf_counter()
+        _status["started_at"] = time.time()
+        try:
+            _import_all(modules or ADMIN_MODULES)
+            if drive_client:
+                _build_drive_client()
+        finally:
+            _status["seconds"] = round(time.perf_counter() - t0, 3)
+            _done.set()
+
+    threading.Thread(target=run, name="admin-warmup", daemon=True).start()
+
+def wait(timeout=None):
+    """
+    Block until the warm-up has finished (True) or timeout expires (False).
+    """
+    return _done.wait(timeout)
+
+def status():
+    """
+    Warm-up progress: per-module import seconds, errors and total time (None while running).
+    """
+    return {
+        "started": _started,
+        "done": _done.is_set(),
+        "seconds": _status["seconds"],
+        "modules": dict(_status["modules"]),
+        "errors": dict(_status["errors"]),
+        "drive_client": _status["drive_client"],
+    }
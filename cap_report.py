@@ -0,0 +1,397 @@
+# cap_report.py
+"""
+CAP report: a full PDF of all seven CAP sections of a city.
+
+Each section is rendered to its own small PDF (charts are drawn with PIL and
+embedded as pre-rasterized PNGs) and cached per (city, section, content hash)
+in memory and under .mahacap_cache/reports. The report is the concatenation of
+the cover and the section PDFs, so after a one-section edit only that section
+is rendered again. Sections are rendered in this process: a worker pool costs
+more to start than the seven sections take (and would fork the Streamlit
+server); publish_all parallelises across cities instead.
+"""
+import os
+import json
+import hashlib
+import datetime
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from local_cache import cache_path
+
+REPORT_VERSION = "1"        # bump when the layout changes so cached sections are re-rendered
+MEMORY_CACHE_SIZE = 256
+
+# section key -> (title, [(field, label, unit)])
+SECTIONS = OrderedDict([
+    ("Basic Info", ("Basic Information", [
+        ("Population", "Population", ""), ("Population_5yr", "Projected Population in 5 years", ""),
+        ("Area", "Area", "sq km"), ("Density", "Population Density", "people/km²"), ("GDP", "GDP", "₹ Crores"),
+        ("Climate_Zone", "Climate Zone", ""), ("Admin", "Administrative Structure", ""),
+        ("CAP_Status", "CAP Status", ""), ("Last_Updated", "Last Updated", ""),
+        ("CAP_Targets", "Overall CAP Goals / Targets", ""), ("MER_Indicators", "MER Indicators", ""),
+        ("Budget", "Budget Allocation for CAP Implementation", "₹ Crores"),
+    ])),
+    ("Energy_Buildings", ("Energy & Buildings", [
+        ("Residential", "Residential Electricity Consumption", "kWh/year"),
+        ("Commercial", "Commercial Electricity Consumption", "kWh/year"),
+        ("Industrial", "Industrial Electricity Consumption", "kWh/year"),
+        ("Public_Building_Energy", "Public Building Energy Consumption", "kWh/year"),
+        ("Renewable_Share", "Renewable Energy Share", "%"), ("EE_Buildings", "Energy-Efficient Buildings Certified", ""),
+        ("Street_Lighting_Type", "Street Lighting Type", ""), ("Street_Lighting_Coverage", "Street Lighting Coverage", "%"),
+        ("Fuel_Types", "Fuel Types Used", ""), ("Green_Policy", "Green Building Policies in Place", ""),
+        ("Emission_Target", "Emission Reduction Target", "%"), ("Action_Plan", "Action Plan", ""),
+        ("Implementation_Strategy", "Implementation Strategy", ""), ("Budget", "Budget Allocation", "₹ Crores"),
+        ("MER_Indicators", "MER Indicators", ""),
+    ])),
+    ("Green_Biodiversity", ("Green Cover & Biodiversity", [
+        ("Green_Cover", "Total Green Cover Area", "ha"), ("Tree_Density", "Tree Density", "trees/km²"),
+        ("Protected_Areas", "Protected Areas", "ha"), ("Urban_Forests", "Urban Forests Area", "ha"),
+        ("Programs", "Biodiversity Programs", ""), ("Target", "Target Increase in Green Cover", "%"),
+        ("Urban_Forest_Plan", "Urban Forests & Biodiversity Actions", ""),
+        ("Implementation_Strategy", "Implementation Strategy", ""), ("Budget", "Budget Allocation", "₹ Crores"),
+        ("MER_Indicators", "MER Indicators", ""),
+    ])),
+    ("Mobility", ("Sustainable Mobility", [
+        ("Public_Transport", "Public Transport Coverage", "%"), ("Non_Motorized", "Non-Motorized Infrastructure", "%"),
+        ("EV_Stations", "EV Charging Stations", ""), ("Vehicle_Emissions", "Average Vehicle Emissions", "gCO2/km"),
+        ("Smart_Projects", "Smart Transport Projects", ""), ("Emission_Target", "Emission Reduction Target", "%"),
+        ("Action_Plan", "Action Plan", ""), ("Implementation_Strategy", "Implementation Strategy", ""),
+        ("Budget", "Budget Allocation", "₹ Crores"), ("MER_Indicators", "MER Indicators", ""),
+    ])),
+    ("Water", ("Water Resources", [
+        ("Consumption", "Total Water Consumption", "ML/year"), ("WWT", "Wastewater Treatment Coverage", "%"),
+        ("RWH", "Rainwater Harvesting Implementation", ""), ("Leakage", "Water Leakage Ratio", "%"),
+        ("Policy", "Water Management Policies", ""), ("Emission_Target", "Emission Reduction Target", "%"),
+        ("Action_Plan", "Action Plan", ""), ("Implementation_Strategy", "Implementation Strategy", ""),
+        ("Budget", "Budget Allocation", "₹ Crores"), ("MER_Indicators", "MER Indicators", ""),
+    ])),
+    ("Waste", ("Waste Management", [
+        ("Total", "Total Waste Generated", "t/year"), ("Recycled", "Waste Recycled", "%"),
+        ("Facilities", "Treatment Facilities", ""), ("Composting", "Composting Infrastructure", ""),
+        ("Hazardous", "Hazardous Waste Policy", ""), ("Emission_Target", "Emission Reduction Target", "%"),
+        ("Action_Plan", "Action Plan", ""), ("Implementation_Strategy", "Implementation Strategy", ""),
+        ("Budget", "Budget Allocation", "₹ Crores"), ("MER_Indicators", "MER Indicators", ""),
+    ])),
+    ("Climate_Data", ("Climate Data & Adaptation", [
+        ("Avg_Temp", "Average Temperature", "°C"), ("Rainfall", "Annual Rainfall", "mm"),
+        ("Extreme_Events", "Extreme Events History", ""), ("Vulnerability", "Sectoral Vulnerability & Risk Assessment", ""),
+        ("Adaptation", "Adaptation & Resilience Action Plan", ""), ("Budget", "Climate Budget Allocation", "₹ Crores"),
+        ("MER_Indicators", "MER Indicators", ""),
+    ])),
+])
+RCP_YEARS = list(range(2020, 2051))
+
+_lock = threading.Lock()
+_memory = OrderedDict()   # (city, section, hash) -> PDF bytes
+
+def report_filename(city_name):
+    return f"{city_name}_CAP_report.pdf"
+
+# -------------------- Charts (PIL) --------------------
+CHART_SIZE = (1200, 560)
+CHART_COLOR = (58, 134, 255)
+GRID_COLOR = (225, 225, 225)
+
+def _font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+def _chart_canvas(title):
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", CHART_SIZE, "white")
+    draw = ImageDraw.Draw(img)
+    draw.text((40, 16), title, fill="black", font=_font(30))
+    return img, draw, (110, 80, CHART_SIZE[0] - 40, CHART_SIZE[1] - 80)   # plot box: left, top, right, bottom
+
+def _png(img):
+    buf = BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+def _y_axis(draw, box, lo, hi):
+    left, top, right, bottom = box
+    for i in range(5):
+        v = lo + (hi - lo) * i / 4
+        y = bottom - (bottom - top) * i / 4
+        draw.line((left, y, right, y), fill=GRID_COLOR, width=2)
+        draw.text((10, y - 10), f"{v:,.4g}", fill="black", font=_font(18))
+
+def bar_chart_png(title, labels, values):
+    """
+    Vertical bar chart as PNG bytes.
+    """
+    img, draw, box = _chart_canvas(title)
+    left, top, right, bottom = box
+    hi = max([v for v in values if v] + [1])
+    _y_axis(draw, box, 0, hi)
+    slot = (right - left) / max(len(values), 1)
+    for i, (label, v) in enumerate(zip(labels, values)):
+        x0 = left + i * slot + slot * 0.15
+        x1 = left + (i + 1) * slot - slot * 0.15
+        y = bottom - (bottom - top) * max(v or 0, 0) / hi
+        draw.rectangle((x0, y, x1, bottom), fill=CHART_COLOR)
+        draw.text((x0, bottom + 10), str(label)[:18], fill="black", font=_font(18))
+    return _png(img)
+
+def line_chart_png(title, xs, ys):
+    """
+    Line chart as PNG bytes.
+    """
+    img, draw, box = _chart_canvas(title)
+    left, top, right, bottom = box
+    lo, hi = min(ys + [0]), max(ys + [0])
+    if hi == lo:
+        hi = lo + 1
+    _y_axis(draw, box, lo, hi)
+    span = (xs[-1] - xs[0]) or 1
+    points = [(left + (right - left) * (x - xs[0]) / span, bottom - (bottom - top) * (y - lo) / (hi - lo))
+              for x, y in zip(xs, ys)]
+    draw.line(points, fill=CHART_COLOR, width=5)
+    for x in xs[::5]:
+        px = left + (right - left) * (x - xs[0]) / span
+        draw.text((px - 20, bottom + 10), str(x), fill="black", font=_font(18))
+    return _png(img)
+
+def _num(section, key):
+    v = section.get(key)
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else 0.0
+
+def section_charts(section_key, section, city_data):
+    """
+    [(PNG bytes)] charts for one section; only charts with data are drawn.
+    """
+    charts = []
+    if section_key == "Basic Info":
+        ghg = city_data.get("GHG") or {}
+        values = {k: v for k, v in ghg.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        if any(values.values()):
+            charts.append(bar_chart_png("GHG Emissions by Sector (tCO2e)", list(values), list(values.values())))
+    elif section_key == "Energy_Buildings":
+        keys = [("Residential", "Residential"), ("Commercial", "Commercial"), ("Industrial", "Industrial"),
+                ("Public_Building_Energy", "Public Buildings")]
+        values = [_num(section, k) for k, _ in keys]
+        if any(values):
+            charts.append(bar_chart_png("Electricity Consumption (kWh/year)", [l for _, l in keys], values))
+    elif section_key == "Green_Biodiversity":
+        keys = [("Green_Cover", "Green Cover"), ("Protected_Areas", "Protected"), ("Urban_Forests", "Urban Forests")]
+        values = [_num(section, k) for k, _ in keys]
+        if any(values):
+            charts.append(bar_chart_png("Green Areas (ha)", [l for _, l in keys], values))
+    elif section_key == "Mobility":
+        keys = [("Public_Transport", "Public Transport"), ("Non_Motorized", "Non-Motorized")]
+        values = [_num(section, k) for k, _ in keys]
+        if any(values):
+            charts.append(bar_chart_png("Mobility Coverage (%)", [l for _, l in keys], values))
+    elif section_key == "Water":
+        keys = [("WWT", "Wastewater Treated"), ("Leakage", "Leakage")]
+        values = [_num(section, k) for k, _ in keys]
+        if any(values):
+            charts.append(bar_chart_png("Water Indicators (%)", [l for _, l in keys], values))
+    elif section_key == "Waste":
+        total, recycled = _num(section, "Total"), _num(section, "Recycled")
+        if total:
+            charts.append(bar_chart_png("Waste (t/year)", ["Recycled", "Not Recycled"],
+                                        [total * recycled / 100, total * (1 - recycled / 100)]))
+    elif section_key == "Climate_Data":
+        rcp = section.get("RCP")
+        if isinstance(rcp, list) and len(rcp) == len(RCP_YEARS) and any(rcp):
+            charts.append(line_chart_png("RCP Temperature Change (°C)", RCP_YEARS, [float(v or 0) for v in rcp]))
+    return charts
+
+# -------------------- PDF rendering --------------------
+def _txt(value):
+    """
+    Text safe for the PDF core fonts (latin-1).
+    """
+    s = str(value).replace("₹", "Rs.").replace("²", "2").replace("–", "-").replace("—", "-")
+    return s.encode("latin-1", "replace").decode("latin-1")
+
+def _format(value, unit):
+    if value is None or value == "" or value == []:
+        return "-"
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, (int, float)):
+        text = f"{value:,.2f}".rstrip("0").rstrip(".") if isinstance(value, float) else f"{value:,}"
+        return f"{text} {unit}".strip()
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    return str(value)
+
+def _document_line(upload):
+    if isinstance(upload, dict) and upload.get("name"):
+        size = upload.get("size")
+        size_text = f" ({size / 1e6:.1f} MB)" if isinstance(size, (int, float)) else ""
+        link = f" - {upload['webViewLink']}" if upload.get("webViewLink") else ""
+        return f"Supporting document: {upload['name']}{size_text}{link}"
+    return None
+
+def _new_pdf(footer):
+    from fpdf import FPDF
+
+    class _PDF(FPDF):
+        def footer(self):
+            self.set_y(-15)
+            self.set_font("Helvetica", size=8)
+            self.set_text_color(120, 120, 120)
+            self.cell(0, 10, text=_txt(footer), align="C")
+
+    pdf = _PDF()
+    pdf.set_auto_page_break(auto=True, margin=18)
+    return pdf
+
+def _paragraph(pdf, text, h=6):
+    pdf.multi_cell(0, h, text=_txt(text))
+    pdf.set_x(pdf.l_margin)
+
+def render_section(city_name, section_key, city_data):
+    """
+    One CAP section as a standalone PDF (bytes).
+    """
+    title, fields = SECTIONS[section_key]
+    section = city_data.get(section_key) or {}
+    if section_key == "Basic Info" and "CAP_Status" not in section and city_data.get("CAP_Status"):
+        section = dict(section, CAP_Status=city_data["CAP_Status"])
+
+    from fpdf.enums import XPos, YPos
+    pdf = _new_pdf(f"{city_name} Climate Action Plan - {title}")
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 16)
+    pdf.cell(0, 10, text=_txt(title), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
+
+    if not section:
+        pdf.set_font("Helvetica", "I", 11)
+        _paragraph(pdf, "No data has been entered for this section.")
+    for key, label, unit in fields:
+        if key not in section:
+            continue
+        pdf.set_font("Helvetica", "B", 10)
+        _paragraph(pdf, label, h=6)
+        pdf.set_font("Helvetica", size=10)
+        _paragraph(pdf, _format(section[key], unit), h=5)
+        pdf.ln(1)
+
+    line = _document_line(section.get("Upload"))
+    if line:
+        pdf.set_font("Helvetica", "I", 9)
+        _paragraph(pdf, line)
+
+    for png in section_charts(section_key, section, city_data):
+        pdf.ln(3)
+        width = pdf.w - pdf.l_margin - pdf.r_margin
+        pdf.image(BytesIO(png), w=width, h=width * CHART_SIZE[1] / CHART_SIZE[0])
+    return bytes(pdf.output())
+
+def render_cover(city_name, city_data, generated_on):
+    from fpdf.enums import XPos, YPos
+    pdf = _new_pdf(f"{city_name} Climate Action Plan")
+    pdf.add_page()
+    pdf.set_font("Helvetica", "B", 24)
+    pdf.ln(50)
+    pdf.cell(0, 14, text=_txt(city_name), new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.set_font("Helvetica", size=16)
+    pdf.cell(0, 10, text="Climate Action Plan Report", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.set_font("Helvetica", size=11)
+    pdf.cell(0, 8, text=_txt(f"CAP Status: {city_data.get('CAP_Status', 'Not Started')}"),
+             new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.cell(0, 8, text=_txt(f"Generated: {generated_on}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.ln(12)
+    pdf.set_font("Helvetica", "B", 12)
+    pdf.cell(0, 8, text="Contents", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font("Helvetica", size=11)
+    for i, (title, _) in enumerate(SECTIONS.values(), start=1):
+        pdf.cell(0, 7, text=_txt(f"{i}. {title}"), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    return bytes(pdf.output())
+
+# -------------------- Cache and assembly --------------------
+def _hash(*parts):
+    payload = json.dumps([REPORT_VERSION] + list(parts), sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def section_hash(section_key, city_data):
+    """
+    Hash of everything a section's PDF is rendered from.
+    """
+    extra = city_data.get("GHG") if section_key == "Basic Info" else None
+    status = city_data.get("CAP_Status") if section_key == "Basic Info" else None
+    return _hash(section_key, city_data.get(section_key) or {}, extra, status)
+
+def report_key(city_name, city_data):
+    """
+    Content key of the whole report (changes when any section does).
+    """
+    from json_utils import to_jsonable
+    city_data = to_jsonable(city_data or {})
+    return _hash(city_name, [section_hash(k, city_data) for k in SECTIONS])
+
+def _disk_path(city_name, section_key, digest):
+    safe = hashlib.md5(city_name.encode("utf-8")).hexdigest()[:12]
+    return cache_path("reports", safe, f"{section_key.replace(' ', '_')}-{digest}.pdf")
+
+def _cached_section(city_name, section_key, digest):
+    key = (city_name, section_key, digest)
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    try:
+        with open(_disk_path(city_name, section_key, digest), "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    _remember(key, data)
+    return data
+
+def _remember(key, data):
+    with _lock:
+        _memory[key] = data
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+def _store_section(city_name, section_key, digest, data):
+    path = _disk_path(city_name, section_key, digest)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    # drop older renders of the same section
+    folder = os.path.dirname(path)
+    prefix = f"{section_key.replace(' ', '_')}-"
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and os.path.join(folder, name) != path and name.endswith(".pdf"):
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+    _remember((city_name, section_key, digest), data)
+
+def _concatenate(parts):
+    from pypdf import PdfWriter, PdfReader
+    writer = PdfWriter()
+    for data in parts:
+        for page in PdfReader(BytesIO(data)).pages:
+            writer.add_page(page)
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+def generate_cap_report_bytes(city_name, city_data):
+    """
+    Full CAP report for a city as PDF bytes. Sections whose content hash is cached are
+    reused; only the others are rendered.
+    """
+    from json_utils import to_jsonable
+    city_data = to_jsonable(city_data or {})
+    digests = {k: section_hash(k, city_data) for k in SECTIONS}
+    sections = {k: _cached_section(city_name, k, d) for k, d in digests.items()}
+    missing = [k for k, v in sections.items() if v is None]
+    for k in missing:
+        sections[k] = render_section(city_name, k, city_data)
+        _store_section(city_name, k, digests[k], sections[k])
+    cover = render_cover(city_name, city_data, datetime.date.today().strftime("%d %B %Y"))
+    return _concatenate([cover] + [sections[k] for k in SECTIONS])
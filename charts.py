@@ -0,0 +1,61 @@
+# charts.py
+"""
+Plotly figures for the public Home and City pages.
+
+Used both by the live pages (through figure_cache) and by public_bundle,
+which compiles them to JSON once per publish.
+"""
+import plotly.express as px
+import plotly.graph_objects as go
+from city_table import GHG_SECTORS
+
+def home_ghg_figure(summary):
+    ghg_values = [summary["ghg_by_sector"].get(s, 0) for s in GHG_SECTORS]
+    return px.bar(x=GHG_SECTORS, y=ghg_values, labels={"x":"Sector","y":"tCO2e"}, title="Maharashtra GHG Emissions by Sector", template="plotly_dark")
+
+def home_pathways_figure():
+    import projection_engine as pe
+    totals = pe.get_projections().state_emissions()
+    fig_p = go.Figure([go.Scatter(x=pe.YEARS, y=totals[k], mode="lines", name=name) for k, name in enumerate(pe.SCENARIOS)])
+    fig_p.update_layout(template="plotly_dark", title="Maharashtra Emission Pathways", xaxis_title="Year", yaxis_title="tCO2e")
+    return fig_p
+
+def home_rcp_figure():
+    import projection_engine as pe
+    fig2 = go.Figure([go.Scatter(x=pe.YEARS, y=values, mode="lines", name=name)
+                      for name, values in pe.reference_temperature().items()])
+    fig2.update_layout(template="plotly_dark", title="Projected RCP Scenarios", xaxis_title="Year",
+                       yaxis_title="Temp Rise (°C)")
+    return fig2
+
+def city_ghg_figure(city):
+    import city_table
+    ghg_sectors = city_table.GHG_SECTORS
+    return px.bar(
+        x=ghg_sectors,
+        y=city_table.ghg_for_city(city, ghg_sectors),
+        labels={"x": "Sector", "y": "tCO2e"},
+        title=f"{city} GHG Emissions by Sector",
+        template="plotly_dark"
+    )
+
+def city_rcp_figure(city):
+    import projection_engine as pe
+    fig_rcp = go.Figure()
+    for name, values in pe.get_projections().city_temperature(city).items():
+        fig_rcp.add_trace(go.Scatter(x=pe.YEARS, y=values, mode="lines", name=name))
+
+    fig_rcp.update_layout(
+        template="plotly_dark",
+        title=f"{city} RCP Scenario Projections",
+        xaxis_title="Year",
+        yaxis_title="Temp Rise (°C)"
+    )
+    return fig_rcp
+
+def city_pathways_figure(city):
+    import projection_engine as pe
+    totals = pe.get_projections().city_emissions(city)
+    fig_p = go.Figure([go.Scatter(x=pe.YEARS, y=totals[k], mode="lines", name=name) for k, name in enumerate(pe.SCENARIOS)])
+    fig_p.update_layout(template="plotly_dark", title=f"{city} Emission Pathways", xaxis_title="Year", yaxis_title="tCO2e")
+    return fig_p
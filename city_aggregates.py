@@ -0,0 +1,68 @@
+# city_aggregates.py
+"""
+Statewide rollups for the Home page, maintained incrementally on every city save.
+
+A summary is a plain dict:
+    {"status_counts": {...}, "total_population": n, "total_area": n,
+     "ghg_by_sector": {sector: tCO2e}, "cities_with_data": [...], "profile_city": name}
+Only cities in city_list.cities are counted, matching what the Home page shows.
+"""
+import copy
+from city_list import cities
+
+CAP_STATUSES = ["Not Started", "In Progress", "Completed"]
+_city_index = {c: i for i, c in enumerate(cities)}
+
+def _number(v):
+    return v if isinstance(v, (int, float)) and not isinstance(v, bool) else 0
+
+def empty_summary():
+    return {
+        "status_counts": {s: len(cities) if s == "Not Started" else 0 for s in CAP_STATUSES},
+        "total_population": 0,
+        "total_area": 0,
+        "ghg_by_sector": {},
+        "cities_with_data": [],
+        "profile_city": None,
+    }
+
+def _add(summary, record, sign):
+    status = record.get("CAP_Status", "Not Started")
+    if status in summary["status_counts"]:
+        summary["status_counts"][status] += sign
+    summary["total_population"] += sign * _number(record.get("Population", {}).get("Total", 0))
+    summary["total_area"] += sign * _number(record.get("Area", 0))
+    for sector, value in record.get("GHG", {}).items():
+        summary["ghg_by_sector"][sector] = summary["ghg_by_sector"].get(sector, 0) + sign * _number(value)
+
+def apply_change(summary, name, old_record, new_record):
+    """
+    Update summary in place for one city going from old_record to new_record.
+    Costs O(1) in the number of cities (plus the profile-city pick among cities with data).
+    """
+    if name not in _city_index:
+        return summary
+    # a city with no record counts as "Not Started"
+    _add(summary, old_record or {}, -1)
+    _add(summary, new_record or {}, +1)
+    with_data = set(summary["cities_with_data"])
+    if new_record:
+        with_data.add(name)
+    else:
+        with_data.discard(name)
+    summary["cities_with_data"] = sorted(with_data, key=_city_index.get)
+    # the Home page shows contact details of the first city (in list order) that has data
+    summary["profile_city"] = summary["cities_with_data"][0] if with_data else None
+    return summary
+
+def build_summary(records):
+    """
+    Full rebuild from {city name: record}; used on cold start or after external writes.
+    """
+    summary = empty_summary()
+    for name, record in records.items():
+        apply_change(summary, name, None, record)
+    return summary
+
+def copy_summary(summary):
+    return copy.deepcopy(summary)
@@ -0,0 +1,11 @@
+# city_list.py
+# The 43 ULBs covered by the dashboard (shared by the app and batch jobs)
+cities = ["Mumbai","Kalyan-Dombivli","Mira-Bhayandar","Navi Mumbai","Bhiwandi-Nizampur",
+          "Ulhasnagar","Ambernath Council","Vasai-Virar","Thane","Badlapur Council",
+          "Pune","Pimpri-Chinchwad","Panvel","Malegaon","Nashik","Nandurbar Council",
+          "Bhusawal Council","Jalgaon","Dhule","Ahilyanagar","Chh. Sambhajinagar",
+          "Jalna","Beed Council","Satara Council","Sangli-Miraj-Kupwad","Kolhapur",
+          "Ichalkaranji","Solapur","Barshi Council","Nanded-Waghala","Yawatmal Council",
+          "Dharashiv","Latur","Udgir Coucil","Akola","Parbhani Council","Amravati",
+          "Achalpur Council","Wardha Coumcil","Hinganghat Ciuncil","Nagpur","Chandrapur",
+          "Gondia Council"]
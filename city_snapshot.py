@@ -0,0 +1,205 @@
+# city_snapshot.py
+"""
+Statewide snapshot of all city data as one zstd-compressed Parquet file.
+
+Each row is a city: the flat typed columns of city_table (for analytics) plus
+the full record as JSON (for a lossless restore). The loader memory-maps the
+file, so a cold start reads one file instead of a state.json download and
+parse per city. A fresh server without a local copy fetches the snapshot
+uploaded to the Drive parent folder once an admin session opens.
+
+Records seeded from a snapshot may be older than the cities' Drive state, so
+they are remembered (seeded_unchanged) until Drive state replaces them or an
+admin edits them.
+
+    python city_snapshot.py export [--path FILE] [--upload]
+    python city_snapshot.py import [--path FILE] [--overwrite]
+"""
+import os
+import sys
+import json
+import argparse
+import threading
+from local_cache import cache_path, read_json, write_json
+
+SNAPSHOT_FILE = "city_snapshot.parquet"
+SNAPSHOT_PATH = os.environ.get("MAHACAP_SNAPSHOT_PATH") or cache_path(SNAPSHOT_FILE)
+SNAPSHOT_MIME = "application/vnd.apache.parquet"
+RECORD_COLUMN = "record_json"
+SNAPSHOT_FORMAT = "1"
+SEEDED_PATH = cache_path("snapshot_seeded.json")   # {city: store version written by the seed}
+
+_seed_lock = threading.Lock()
+_seed_started = False
+_drive_seed_started = False
+
+def to_arrow(records):
+    """
+    Arrow table for {city: record} (rows in city_table order).
+    """
+    import pyarrow as pa
+    import city_table
+    from json_utils import to_jsonable
+
+    table = city_table.build_table(records).loc[list(records)] if records else city_table.build_table({}).iloc[0:0]
+    frame = table.reset_index()
+    frame[RECORD_COLUMN] = [json.dumps(to_jsonable(records[c]), ensure_ascii=False, sort_keys=True) for c in frame["City"]]
+    arrow = pa.Table.from_pandas(frame, preserve_index=False)
+    return arrow.replace_schema_metadata({"mahacap_snapshot": SNAPSHOT_FORMAT})
+
+def write_snapshot(records, path=SNAPSHOT_PATH):
+    """
+    Write {city: record} to path (atomically). Returns the path.
+    """
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    pq.write_table(to_arrow(records), tmp, compression="zstd", use_dictionary=True)
+    os.replace(tmp, path)
+    return path
+
+def read_table(path=SNAPSHOT_PATH, columns=None):
+    """
+    The snapshot as an Arrow table read through a memory map (None if the file is missing).
+    columns: read only these columns (e.g. the flat ones for analytics).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if not os.path.exists(path):
+        return None
+    with pa.memory_map(path, "r") as source:
+        return pq.read_table(source, columns=columns, memory_map=True)
+
+def load_records(path=SNAPSHOT_PATH):
+    """
+    {city: record} restored from the snapshot ({} if the file is missing).
+    """
+    table = read_table(path, columns=["City", RECORD_COLUMN])
+    if table is None:
+        return {}
+    names = table.column("City").to_pylist()
+    return {c: json.loads(r) for c, r in zip(names, table.column(RECORD_COLUMN).to_pylist())}
+
+def export_snapshot(path=SNAPSHOT_PATH):
+    """
+    Snapshot the current city store to path.
+    """
+    import city_store
+    return write_snapshot(city_store.all_cities(), path)
+
+def import_snapshot(path=SNAPSHOT_PATH, overwrite=False):
+    """
+    Load the snapshot into the city store in one transaction. Cities already in the
+    store are kept unless overwrite=True. Returns the number of cities written.
+    """
+    import city_store
+    records = load_records(path)
+    if not overwrite:
+        records = {c: r for c, r in records.items() if not city_store.has_city(c)}
+    if records:
+        city_store.save_cities(records)
+    return len(records)
+
+def _seed(path):
+    import city_store
+    records = load_records(path)
+    if city_store.data_version() or not records:
+        return 0
+    versions = city_store.save_cities(records)
+    write_json(SEEDED_PATH, versions)
+    return len(versions)
+
+def seed_store(path=SNAPSHOT_PATH):
+    """
+    Startup hook: fill an empty city store from the local snapshot, once per process.
+    """
+    global _seed_started
+    with _seed_lock:
+        if _seed_started:
+            return 0
+        _seed_started = True
+    import city_store
+    if city_store.data_version() or not os.path.exists(path):
+        return 0
+    return _seed(path)
+
+def start_drive_seed(parent_id, path=SNAPSHOT_PATH):
+    """
+    Fresh server without a local snapshot: fetch the one uploaded to the Drive parent folder
+    and seed the empty store from it, in a background thread, once per process. Started from
+    the admin panel so the Drive client is never loaded on the public pages' path.
+    """
+    global _drive_seed_started
+    with _seed_lock:
+        if _drive_seed_started or not parent_id:
+            return
+        _drive_seed_started = True
+
+    def run():
+        import city_store
+        try:
+            if not city_store.data_version() and not os.path.exists(path) and download_snapshot(parent_id, path):
+                _seed(path)
+        except Exception:
+            pass
+
+    threading.Thread(target=run, name="snapshot-seed", daemon=True).start()
+
+def seeded_unchanged(name):
+    """
+    True while the store still holds the record a snapshot seed wrote for this city
+    (not yet replaced by Drive state or edited), i.e. it may be older than Drive.
+    """
+    import city_store
+    version = read_json(SEEDED_PATH, {}).get(name)
+    return version is not None and version == city_store.city_version(name)
+
+def upload_snapshot(parent_id=None, path=SNAPSHOT_PATH):
+    """
+    Sync the snapshot file to the Drive parent folder (skipped when unchanged).
+    """
+    from drive_sync import sync_bytes
+    if not parent_id:
+        raise ValueError("A Drive parent folder ID is required to upload the snapshot")
+    with open(path, "rb") as f:
+        data = f.read()
+    return sync_bytes(parent_id, SNAPSHOT_FILE, data, mimetype=SNAPSHOT_MIME)
+
+def download_snapshot(parent_id, path=SNAPSHOT_PATH):
+    """
+    Fetch the snapshot uploaded to the Drive parent folder to path. Returns the path, or None if there is none.
+    """
+    from drive_sync import find_files
+    from drive_download import download_file
+    files = find_files(parent_id, SNAPSHOT_FILE)
+    if not files:
+        return None
+    data = download_file(files[0]["id"], files[0].get("md5Checksum"), files[0].get("size"))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the statewide city data snapshot (Parquet).")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--path", default=SNAPSHOT_PATH, help=f"Snapshot file (default: {SNAPSHOT_PATH})")
+    parser.add_argument("--upload", action="store_true", help="export: also sync the file to the Drive parent folder")
+    parser.add_argument("--parent-id", default=os.environ.get("PARENT_FOLDER_ID"), help="Drive parent folder (default: $PARENT_FOLDER_ID)")
+    parser.add_argument("--overwrite", action="store_true", help="import: replace cities already in the store")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        path = export_snapshot(args.path)
+        print(f"Wrote {path} ({os.path.getsize(path):,} bytes)")
+        if args.upload:
+            result = upload_snapshot(args.parent_id, path)
+            print(f"Drive: {result.get('action')} {result.get('id')}")
+    else:
+        print(f"Imported {import_snapshot(args.path, overwrite=args.overwrite)} cities from {args.path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
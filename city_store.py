@@ -0,0 +1,187 @@
+# city_store.py
+"""
+Process-wide city data store shared by every Streamlit session.
+
+Records live in a local SQLite database; reads are served from an in-memory
+read-through cache that is reloaded only when the database changes (including
+writes from other processes, detected via PRAGMA data_version). Statewide
+rollups (city_aggregates) are updated in the same transaction as each save.
+"""
+import os
+import copy
+import json
+import time
+import sqlite3
+import threading
+from local_cache import cache_path
+from json_utils import to_jsonable
+from city_aggregates import apply_change, build_summary, copy_summary
+
+DB_PATH = os.environ.get("MAHACAP_DB_PATH") or cache_path("city_data.sqlite3")
+
+_lock = threading.RLock()
+_conn = None
+_records = None        # {city name: record}
+_versions = {}         # {city name: row version}
+_db_version = None     # PRAGMA data_version at last load
+_summary = None        # city_aggregates summary for the current records
+_listeners = []        # callbacks(name, record, version) run after each save
+_tx_hooks = []         # callbacks(conn, name, record) run inside each save's transaction
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS cities (
+                             name TEXT PRIMARY KEY,
+                             data TEXT NOT NULL,
+                             version INTEGER NOT NULL,
+                             updated_at REAL NOT NULL)""")
+        _conn.execute("""CREATE TABLE IF NOT EXISTS summary (
+                             id INTEGER PRIMARY KEY CHECK (id = 1),
+                             data TEXT NOT NULL,
+                             version INTEGER NOT NULL)""")
+    return _conn
+
+def _write_summary(conn, summary, version):
+    conn.execute("INSERT OR REPLACE INTO summary (id, data, version) VALUES (1, ?, ?)",
+                 (json.dumps(summary, ensure_ascii=False), version))
+
+def _refresh():
+    """
+    (Re)load the cache if this is the first read or another connection changed the database.
+    Must be called with _lock held.
+    """
+    global _records, _versions, _db_version, _summary
+    conn = _connect()
+    db_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if _records is not None and db_version == _db_version:
+        return
+    rows = conn.execute("SELECT name, data, version FROM cities").fetchall()
+    _records = {name: json.loads(data) for name, data, _ in rows}
+    _versions = {name: version for name, _, version in rows}
+    version = max(_versions.values(), default=0)
+    row = conn.execute("SELECT data, version FROM summary WHERE id = 1").fetchone()
+    if row and row[1] == version:
+        _summary = json.loads(row[0])
+    else:
+        _summary = build_summary(_records)
+        _write_summary(conn, _summary, version)
+    _db_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+def all_cities():
+    """
+    {city name: record} for every stored city. Shared across sessions: treat as read-only.
+    """
+    with _lock:
+        _refresh()
+        return _records
+
+def get_city(name):
+    """
+    Copy of one city's record ({} if the city has no data yet).
+    """
+    with _lock:
+        _refresh()
+        return copy.deepcopy(_records.get(name, {}))
+
+def has_city(name):
+    with _lock:
+        _refresh()
+        return name in _records
+
+def city_version(name):
+    """
+    Version of a city's record (0 if never saved); changes on every save of that city.
+    """
+    with _lock:
+        _refresh()
+        return _versions.get(name, 0)
+
+def data_version():
+    """
+    Version of the whole dataset; changes on every save of any city.
+    """
+    with _lock:
+        _refresh()
+        return max(_versions.values(), default=0)
+
+def subscribe(callback):
+    """
+    Register callback(name, record, version), called after every save (keep it cheap).
+    """
+    _listeners.append(callback)
+
+def subscribe_transaction(callback):
+    """
+    Register callback(conn, name, record), run inside every save's transaction on the store's
+    own connection: its writes commit (or roll back) with the save and, unlike writes from
+    another connection, do not make the store reload every record.
+    """
+    _tx_hooks.append(callback)
+
+def get_summary():
+    """
+    Statewide rollups (status counts, population, area, GHG by sector) kept up to date on every save.
+    """
+    with _lock:
+        _refresh()
+        return copy_summary(_summary)
+
+def save_city(name, record):
+    """
+    Replace a city's record and update the statewide summary. Returns the new record version.
+    """
+    return save_cities({name: record})[name]
+
+def save_cities(records):
+    """
+    Replace several cities' records in one transaction. Returns {city name: new version}.
+    """
+    global _summary
+    records = {name: to_jsonable(record) for name, record in records.items()}
+    with _lock:
+        _refresh()
+        conn = _connect()
+        version = max(_versions.values(), default=0)
+        summary = copy_summary(_summary)
+        versions = {}
+        conn.execute("BEGIN")
+        try:
+            for name, record in records.items():
+                version += 1
+                versions[name] = version
+                apply_change(summary, name, _records.get(name), record)
+                conn.execute("INSERT OR REPLACE INTO cities (name, data, version, updated_at) VALUES (?, ?, ?, ?)",
+                             (name, json.dumps(record, ensure_ascii=False), version, time.time()))
+                for hook in _tx_hooks:
+                    hook(conn, name, record)
+            _write_summary(conn, summary, version)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _summary = summary
+        for name, record in records.items():
+            _records[name] = record
+            _versions[name] = versions[name]
+            for callback in _listeners:
+                callback(name, record, versions[name])
+        # our own write does not change PRAGMA data_version for this connection, so the cache stays valid
+        return versions
+
+def update_city(name, fields):
+    """
+    Merge top-level fields into a city's record (other sections are kept). Returns the new version.
+    """
+    with _lock:
+        record = get_city(name)
+        record.update(fields)
+        return save_city(name, record)
+
+def update_section(name, section, values):
+    """
+    Replace one CAP section (e.g. "Energy_Buildings") of a city's record. Returns the new version.
+    """
+    return update_city(name, {section: values})
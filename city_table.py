@@ -0,0 +1,150 @@
+# city_table.py
+"""
+Columnar view of the city store: one row per city, one typed column per field.
+
+Charts and statewide queries use this table (vectorised pandas/NumPy operations)
+instead of walking nested city dicts. The table is kept in sync with every
+city_store save by replacing just the saved row.
+"""
+import threading
+import numpy as np
+import pandas as pd
+import city_store
+from city_list import cities
+
+GHG_SECTORS = ["Energy", "Transport", "Waste", "Water", "Buildings", "Industry"]
+
+# column name -> (path in the city record, dtype)
+SCHEMA = {
+    "CAP_Status": (("CAP_Status",), "string"),
+    "District": (("District",), "string"),
+    "Population_Total": (("Population", "Total"), "float64"),
+    "Area": (("Area",), "float64"),
+    "Basic_Population": (("Basic Info", "Population"), "float64"),
+    "Basic_Area": (("Basic Info", "Area"), "float64"),
+    "Population_5yr": (("Basic Info", "Population_5yr"), "float64"),
+    "Energy_Residential_kWh": (("Energy_Buildings", "Residential"), "float64"),
+    "Energy_Commercial_kWh": (("Energy_Buildings", "Commercial"), "float64"),
+    "Energy_Industrial_kWh": (("Energy_Buildings", "Industrial"), "float64"),
+    "Energy_Public_kWh": (("Energy_Buildings", "Public_Building_Energy"), "float64"),
+    "Energy_Renewable_Share": (("Energy_Buildings", "Renewable_Share"), "float64"),
+    "Energy_Target": (("Energy_Buildings", "Emission_Target"), "float64"),
+    "Mobility_Vehicle_gCO2_km": (("Mobility", "Vehicle_Emissions"), "float64"),
+    "Mobility_Public_Transport": (("Mobility", "Public_Transport"), "float64"),
+    "Transport_Target": (("Mobility", "Emission_Target"), "float64"),
+    "Water_Consumption_ML": (("Water", "Consumption"), "float64"),
+    "Water_WWT": (("Water", "WWT"), "float64"),
+    "Water_Target": (("Water", "Emission_Target"), "float64"),
+    "Waste_Total_t": (("Waste", "Total"), "float64"),
+    "Waste_Recycled": (("Waste", "Recycled"), "float64"),
+    "Waste_Target": (("Waste", "Emission_Target"), "float64"),
+}
+for _s in GHG_SECTORS:
+    SCHEMA[f"GHG_{_s}"] = (("GHG", _s), "float64")
+
+_lock = threading.Lock()
+_table = None
+_table_version = None
+
+def ghg_column(sector):
+    return f"GHG_{sector}"
+
+def _value(record, path):
+    node = record
+    for k in path:
+        if not isinstance(node, dict) or k not in node:
+            return None
+        node = node[k]
+    return node
+
+def to_row(record):
+    """
+    Flatten one city record into {column: value} following SCHEMA (missing fields -> None).
+    """
+    row = {}
+    for col, (path, dtype) in SCHEMA.items():
+        v = _value(record, path)
+        if dtype == "float64" and (isinstance(v, bool) or not isinstance(v, (int, float))):
+            v = None
+        elif dtype == "string" and v is not None:
+            v = str(v)
+        row[col] = v
+    return row
+
+def _empty_frame(index):
+    return pd.DataFrame({col: pd.Series(index=index, dtype=dtype) for col, (_, dtype) in SCHEMA.items()},
+                        index=pd.Index(index, name="City"))
+
+def build_table(records):
+    """
+    Build the table for {city name: record}. Rows are every listed city (in list order)
+    plus any other stored record; cities without data have NaN/NA values.
+    """
+    index = list(cities) + [c for c in records if c not in set(cities)]
+    df = _empty_frame(index)
+    rows = {c: to_row(r) for c, r in records.items()}
+    if rows:
+        filled = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=list(SCHEMA))
+        for col, (_, dtype) in SCHEMA.items():
+            df.loc[filled.index, col] = filled[col].astype(dtype)
+    return df
+
+def _on_save(name, record, version):
+    """
+    city_store save hook: replace just the saved city's row. Copy-on-write: readers may hold
+    the previous table outside the lock, so the row is set on a copy that then replaces it.
+    """
+    global _table, _table_version
+    with _lock:
+        if _table is None or _table_version != version - 1 or name not in _table.index:
+            # missed an update (e.g. a write from another process) or a new city; rebuild lazily
+            _table = None
+            return
+        row = to_row(record)
+        table = _table.copy()
+        for col, (_, dtype) in SCHEMA.items():
+            v = row[col]
+            table.at[name, col] = (np.nan if dtype == "float64" else pd.NA) if v is None else v
+        _table, _table_version = table, version
+
+city_store.subscribe(_on_save)
+
+def get_table():
+    """
+    The current city table. Shared across sessions: treat as read-only.
+    """
+    global _table, _table_version
+    version = city_store.data_version()
+    with _lock:
+        if _table is not None and _table_version == version:
+            return _table
+    # build outside our lock: city_store calls _on_save while holding its own lock
+    records = city_store.all_cities()
+    table = build_table(records)
+    with _lock:
+        _table, _table_version = table, version
+        return _table
+
+def city_row(name):
+    """
+    One city's row as a Series (all NaN/NA when the city has no data).
+    """
+    table = get_table()
+    if name in table.index:
+        return table.loc[name]
+    return _empty_frame([name]).loc[name]
+
+def ghg_by_city(sector, city_names=None):
+    """
+    tCO2e for one sector per city (NaN where not reported), as a Series indexed by city.
+    """
+    table = get_table()
+    col = table[ghg_column(sector)]
+    return col.reindex(city_names) if city_names is not None else col
+
+def ghg_for_city(name, sectors=GHG_SECTORS):
+    """
+    Per-sector tCO2e for one city (0 where not reported), in the order of sectors.
+    """
+    row = city_row(name)
+    return row[[ghg_column(s) for s in sectors]].astype("float64").fillna(0).to_numpy()
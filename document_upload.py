@@ -0,0 +1,78 @@
+# document_upload.py
+"""
+Ingestion of the supporting documents attached in the Generate CAP forms.
+
+Each uploaded file is streamed to the city's Drive folder in chunks (resumable
+upload) and replaced in the city record by a small reference
+{name, file_id, size, md5, mimetype, webViewLink}, so the city store and
+session state keep no file contents. Streamlit still holds the UploadedFile in
+memory for the rerun that saves it.
+"""
+import os
+import hashlib
+import mimetypes
+from drive_sync import find_files
+from drive_upload import upload_stream_to_folder, UPLOAD_CHUNK_SIZE
+
+# keep in line with server.maxUploadSize in .streamlit/config.toml
+MAX_DOCUMENT_MB = int(os.environ.get("MAX_DOCUMENT_MB", "50"))
+HASH_BLOCK = 1024 * 1024
+
+class DocumentTooLarge(ValueError):
+    pass
+
+def is_reference(value):
+    """
+    True for a stored document reference (as opposed to an uploaded file object).
+    """
+    return isinstance(value, dict) and "file_id" in value
+
+def is_upload(value):
+    return value is not None and hasattr(value, "read") and hasattr(value, "name")
+
+def _size(f):
+    size = getattr(f, "size", None)
+    if size is None:
+        pos = f.tell()
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(pos)
+    return size
+
+def _md5(f):
+    f.seek(0)
+    h = hashlib.md5()
+    for block in iter(lambda: f.read(HASH_BLOCK), b""):
+        h.update(block)
+    f.seek(0)
+    return h.hexdigest()
+
+def _reference(file, name, size, md5, mimetype):
+    return {"name": name, "file_id": file["id"], "size": size, "md5": md5, "mimetype": mimetype,
+            "webViewLink": file.get("webViewLink")}
+
+def ingest_document(uploaded, folder_id, max_bytes=MAX_DOCUMENT_MB * 1024 * 1024, chunk_size=UPLOAD_CHUNK_SIZE,
+                    progress=None):
+    """
+    Stream an uploaded file (Streamlit UploadedFile or any binary file object with .name)
+    into folder_id and return its reference. A file with the same name and content
+    already in the folder is reused instead of uploaded again; an interrupted upload
+    of the same file resumes where it stopped. progress(sent_bytes, total_bytes) is
+    called after every chunk.
+    Raises DocumentTooLarge when the file exceeds max_bytes.
+    """
+    name = os.path.basename(uploaded.name)
+    size = _size(uploaded)
+    if size > max_bytes:
+        raise DocumentTooLarge(f"{name} is {size / 1e6:.1f} MB; the limit is {max_bytes / 1e6:.0f} MB")
+    mimetype = getattr(uploaded, "type", None) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    md5 = _md5(uploaded)
+
+    for existing in find_files(folder_id, name):
+        if existing.get("md5Checksum") == md5:
+            return _reference(existing, name, size, md5, mimetype)
+
+    file = upload_stream_to_folder(uploaded, name, folder_id, mimetype=mimetype, chunk_size=chunk_size,
+                                   resume_key=f"{folder_id}/{name}/{md5}", progress=progress,
+                                   fields="id,name,webViewLink")
+    return _reference(file, name, size, md5, mimetype)
@@ -0,0 +1,125 @@
+# drive_download.py
+"""
+Download layer for Drive files (state snapshots, change files, documents).
+
+Downloaded content is kept in a local on-disk cache keyed by file ID + md5Checksum,
+so a file is fetched at most once per content version; the cache is trimmed
+least-recently-used first to DOWNLOAD_CACHE_MB. Files larger than
+PARALLEL_MIN_BYTES are fetched as parallel HTTP range requests.
+"""
+import os
+import glob
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from gdrive_auth import get_drive_service, execute
+from local_cache import cache_path, remove
+
+DOWNLOAD_CACHE_DIR = "downloads"
+DOWNLOAD_CACHE_MB = int(os.environ.get("DOWNLOAD_CACHE_MB", "256"))
+RANGE_SIZE = int(os.environ.get("DOWNLOAD_RANGE_SIZE", str(4 * 1024 * 1024)))
+PARALLEL_MIN_BYTES = 2 * RANGE_SIZE
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "8"))
+
+_trim_lock = threading.Lock()
+
+class ChecksumMismatch(IOError):
+    pass
+
+def _cache_file(file_id, md5):
+    return cache_path(DOWNLOAD_CACHE_DIR, f"{file_id}-{md5}")
+
+def cached(file_id, md5):
+    """
+    Cached bytes for (file_id, md5), or None. A hit marks the entry as recently used.
+    """
+    if not md5:
+        return None
+    path = _cache_file(file_id, md5)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+def _store(file_id, md5, data):
+    path = _cache_file(file_id, md5)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    # older versions of the same file are never read again
+    for old in glob.glob(cache_path(DOWNLOAD_CACHE_DIR, f"{file_id}-*")):
+        if old != path and not old.endswith(".tmp"):
+            remove(old)
+    trim_cache()
+
+def trim_cache(max_bytes=None):
+    """
+    Delete least-recently-used cache entries until the cache fits in max_bytes (default DOWNLOAD_CACHE_MB).
+    """
+    max_bytes = DOWNLOAD_CACHE_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    with _trim_lock:
+        entries = []
+        for path in glob.glob(cache_path(DOWNLOAD_CACHE_DIR, "*")):
+            if path.endswith(".tmp"):
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            remove(path)
+            total -= size
+
+def _metadata(file_id):
+    return execute(get_drive_service().files().get(fileId=file_id, fields="id,size,md5Checksum"))
+
+def _get_range(file_id, start, end):
+    request = get_drive_service().files().get_media(fileId=file_id)
+    request.headers["Range"] = f"bytes={start}-{end}"
+    return execute(request)
+
+def _fetch(file_id, size):
+    if size is None or size < PARALLEL_MIN_BYTES:
+        return execute(get_drive_service().files().get_media(fileId=file_id))
+    ranges = [(start, min(start + RANGE_SIZE, size) - 1) for start in range(0, size, RANGE_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(ranges))) as pool:
+        parts = list(pool.map(lambda r: _get_range(file_id, *r), ranges))
+    return b"".join(parts)
+
+def download_file(file_id, md5=None, size=None):
+    """
+    Content of a Drive file, served from the disk cache when (file_id, md5) is cached.
+    Pass md5/size from an earlier listing (md5Checksum/size fields) to skip the metadata call.
+    """
+    if md5 is None or size is None:
+        meta = _metadata(file_id)
+        md5 = md5 or meta.get("md5Checksum")
+        size = size if size is not None else meta.get("size")
+    size = int(size) if size is not None else None
+
+    data = cached(file_id, md5)
+    if data is not None:
+        return data
+    data = _fetch(file_id, size)
+    if md5:
+        if hashlib.md5(data).hexdigest() != md5:
+            raise ChecksumMismatch(f"Downloaded content of {file_id} does not match md5 {md5}")
+        _store(file_id, md5, data)
+    return data
+
+def download_document(reference):
+    """
+    Content of a document stored as a reference by document_upload (file_id, md5, size).
+    """
+    return download_file(reference["file_id"], reference.get("md5"), reference.get("size"))
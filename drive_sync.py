@@ -0,0 +1,153 @@
+# drive_sync.py
+"""
+Content-addressed sync of small files into Drive folders.
+
+Every file we write is recorded in a local manifest {folder_id/filename: hash, md5, file}.
+A write whose hash matches the manifest (or the remote md5Checksum / contentHash
+app property) is skipped; changed content updates the existing file in place.
+A manifest hit is confirmed with one metadata call, so a file deleted, trashed or
+edited on Drive is written again.
+"""
+import hashlib
+import threading
+from io import BytesIO
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from gdrive_auth import get_drive_service, execute
+from local_cache import cache_path, read_json, write_json
+
+MANIFEST_FILE = "sync_manifest.json"
+FILE_FIELDS = "id,name,md5Checksum,appProperties,webViewLink,webContentLink"
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+def _escape(s: str) -> str:
+    return s.replace("'", "\\'")
+
+def content_hash(data):
+    """
+    md5 hex digest of bytes (the same digest Drive reports as md5Checksum).
+    """
+    return hashlib.md5(data).hexdigest()
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None:
+        _manifest = read_json(cache_path(MANIFEST_FILE), {}) or {}
+    return _manifest
+
+def _manifest_key(folder_id, filename):
+    return f"{folder_id}/{filename}"
+
+def manifest_entry(folder_id, filename):
+    with _manifest_lock:
+        return _load_manifest().get(_manifest_key(folder_id, filename))
+
+def _record(folder_id, filename, key, file):
+    with _manifest_lock:
+        _load_manifest()[_manifest_key(folder_id, filename)] = {"hash": key, "md5": file.get("md5Checksum"),
+                                                                "file": _public_fields(file)}
+        write_json(cache_path(MANIFEST_FILE), _manifest)
+
+def forget(folder_id, filename):
+    """
+    Drop a manifest entry so the next sync re-checks Drive.
+    """
+    with _manifest_lock:
+        if _load_manifest().pop(_manifest_key(folder_id, filename), None) is not None:
+            write_json(cache_path(MANIFEST_FILE), _manifest)
+
+def find_files(folder_id, filename):
+    service = get_drive_service()
+    q = f"name = '{_escape(filename)}' and '{folder_id}' in parents and trashed = false"
+    return execute(service.files().list(q=q, spaces='drive', fields=f'files({FILE_FIELDS})')).get('files', [])
+
+def _public_fields(file):
+    return {k: file[k] for k in ("id", "name", "webViewLink", "webContentLink") if k in file}
+
+def set_public_permission(service, file_id):
+    """
+    Make a file readable by anyone with the link.
+    """
+    return execute(service.permissions().create(fileId=file_id, body={'type': 'anyone', 'role': 'reader'},
+                                                fields='id'))
+
+def _manifest_hit_valid(service, entry):
+    """
+    True if the file a manifest entry points to is still on Drive, untrashed and unedited.
+    """
+    try:
+        remote = execute(service.files().get(fileId=entry["file"]["id"], fields='id,trashed,md5Checksum'))
+    except HttpError as e:
+        if int(getattr(e.resp, "status", 0) or 0) == 404:
+            return False
+        raise
+    return not remote.get('trashed') and (entry.get("md5") is None or remote.get('md5Checksum') == entry["md5"])
+
+def sync_bytes(folder_id, filename, data, mimetype='application/octet-stream', content_key=None, remove_duplicates=False,
+               app_properties=None, make_public=False):
+    """
+    Write data to folder_id/filename only if its content changed.
+
+    content_key: optional hash of the *inputs* for outputs that are not byte-stable
+    (e.g. PDFs/XLSX embedding a creation timestamp); defaults to the md5 of data.
+    app_properties: extra Drive appProperties written alongside the content.
+    make_public: share a newly created file with anyone who has the link.
+    Returns the Drive file resource with an extra "action": "skipped" | "updated" | "created".
+    """
+    if hasattr(data, 'getvalue'):
+        data = data.getvalue()
+    md5 = content_hash(data)
+    key = content_key or md5
+
+    service = get_drive_service()
+    entry = manifest_entry(folder_id, filename)
+    stale = False
+    if entry and entry["hash"] == key:
+        if _manifest_hit_valid(service, entry):
+            return dict(entry["file"], action="skipped")
+        # deleted or edited on Drive since we wrote it: its contentHash no longer describes the content
+        forget(folder_id, filename)
+        stale = True
+
+    existing = find_files(folder_id, filename)
+    current = existing[0] if existing else None
+    if remove_duplicates:
+        for extra in existing[1:]:
+            try:
+                execute(service.files().delete(fileId=extra['id']))
+            except Exception:
+                pass
+
+    if current is not None and not stale:
+        remote_key = (current.get('appProperties') or {}).get('contentHash')
+        if remote_key == key or (content_key is None and current.get('md5Checksum') == md5):
+            _record(folder_id, filename, key, current)
+            return dict(_public_fields(current), action="skipped")
+
+    media = MediaIoBaseUpload(BytesIO(data), mimetype=mimetype, resumable=True)
+    body = {'appProperties': dict(app_properties or {}, contentHash=key)}
+    fields = 'id,name,md5Checksum,webViewLink,webContentLink'
+    action = "created"
+    file = None
+    if current is not None:
+        try:
+            file = execute(service.files().update(fileId=current['id'], body=body, media_body=media, fields=fields))
+            action = "updated"
+        except HttpError as e:
+            if int(getattr(e.resp, "status", 0) or 0) != 404:
+                raise
+            media = MediaIoBaseUpload(BytesIO(data), mimetype=mimetype, resumable=True)
+    if file is None:
+        body.update({'name': filename, 'parents': [folder_id]})
+        file = execute(service.files().create(body=body, media_body=media, fields=fields))
+        if make_public:
+            try:
+                set_public_permission(service, file['id'])
+            except Exception:
+                # the file is written; sharing can be fixed by hand
+                pass
+
+    _record(folder_id, filename, key, file)
+    return dict(_public_fields(file), action=action)
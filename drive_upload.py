@@ -1,33 +1,143 @@
 # drive_upload.py  
 import os
-from googleapiclient.http import MediaFileUpload
-from gdrive_auth import get_drive_service
+import time
+import socket
+import threading
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+from gdrive_auth import get_drive_service, checkout_http, checkin_http, execute
+from drive_sync import set_public_permission
+from local_cache import cache_path, read_json, write_json
+
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+FOLDER_INDEX_FILE = 'folder_index.json'
+FOLDER_INDEX_TTL = int(os.environ.get("FOLDER_INDEX_TTL", str(6 * 3600)))
+FOLDER_VERIFY_TTL = int(os.environ.get("FOLDER_VERIFY_TTL", "300"))   # re-check a cached folder id after this
+ANY_PARENT = '*'
+# Resumable uploads: chunk size must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_SESSIONS_FILE = 'upload_sessions.json'
+UPLOAD_SESSION_TTL = 6 * 24 * 3600   # Drive keeps a resumable session URI for about a week
+CHUNK_RETRIES = int(os.environ.get("UPLOAD_CHUNK_RETRIES", "8"))
+
+# {parent id: {'loaded_at': epoch seconds, 'folders': {name: folder id}}}
+_folder_index = {}
+_index_lock = threading.Lock()
+_verified = {}   # folder id -> epoch seconds it was last confirmed to exist
+_sessions_lock = threading.Lock()
 
 def _escape_drive_query_value(s: str) -> str:
     """Escape single quotes for Drive query."""
     return s.replace("'", "\\'")
 
+def _list_folders(parent_id=None):
+    """
+    List every folder under parent_id (or visible to the service account) with one paginated query.
+    Returns {folder name: folder id}.
+    """
+    service = get_drive_service()
+    q = f"mimeType='{FOLDER_MIME}' and trashed=false"
+    if parent_id:
+        q += f" and '{parent_id}' in parents"
+
+    folders = {}
+    page_token = None
+    while True:
+        resp = execute(service.files().list(q=q, spaces='drive', fields='nextPageToken, files(id,name)',
+                                            pageSize=1000, pageToken=page_token))
+        for f in resp.get('files', []):
+            folders.setdefault(f['name'], f['id'])
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            return folders
+
+def _persist_folder_index():
+    write_json(cache_path(FOLDER_INDEX_FILE), _folder_index)
+
+def load_folder_index(parent_id=None, force=False):
+    """
+    Return the {folder name: folder id} index for parent_id.
+    Served from memory, then from the local cache file, and only re-listed from Drive
+    once FOLDER_INDEX_TTL has passed (or force=True).
+    """
+    key = parent_id or ANY_PARENT
+    with _index_lock:
+        if not _folder_index:
+            _folder_index.update(read_json(cache_path(FOLDER_INDEX_FILE), {}) or {})
+        entry = _folder_index.get(key)
+        if not force and entry and time.time() - entry.get('loaded_at', 0) < FOLDER_INDEX_TTL:
+            return entry['folders']
+
+    folders = _list_folders(parent_id)
+    with _index_lock:
+        _folder_index[key] = {'loaded_at': time.time(), 'folders': folders}
+        _persist_folder_index()
+    return folders
+
+def _remember_folder(parent_id, name, folder_id):
+    with _index_lock:
+        entry = _folder_index.setdefault(parent_id or ANY_PARENT, {'loaded_at': time.time(), 'folders': {}})
+        entry['folders'][name] = folder_id
+        _persist_folder_index()
+
+def _forget_folder(parent_id, name):
+    with _index_lock:
+        entry = _folder_index.get(parent_id or ANY_PARENT)
+        if entry and entry['folders'].pop(name, None) is not None:
+            _persist_folder_index()
+
+def _folder_exists(service, folder_id):
+    """
+    True if folder_id is still a live folder; confirmed at most every FOLDER_VERIFY_TTL seconds.
+    """
+    now = time.time()
+    if now - _verified.get(folder_id, 0) < FOLDER_VERIFY_TTL:
+        return True
+    try:
+        folder = execute(service.files().get(fileId=folder_id, fields='id,trashed'))
+    except HttpError as e:
+        if int(getattr(e.resp, "status", 0) or 0) == 404:
+            return False
+        raise
+    if folder.get('trashed'):
+        return False
+    _verified[folder_id] = now
+    return True
+
+def _create_folder(service, name, parent_id=None):
+    file_metadata = {'name': name, 'mimeType': FOLDER_MIME}
+    if parent_id:
+        file_metadata['parents'] = [parent_id]
+    folder = execute(service.files().create(body=file_metadata, fields='id'))
+    return folder.get('id')
+
 def get_or_create_folder(city_name, parent_id=None):
     """
     Find existing folder named city_name (under parent if given), else create it.
+    Resolves from the folder index; a cached id is confirmed with a metadata call at most every
+    FOLDER_VERIFY_TTL seconds and dropped if the folder was deleted (404) or trashed.
     Returns folder_id.
     """
+    folders = load_folder_index(parent_id)
     service = get_drive_service()
+    if city_name in folders:
+        if _folder_exists(service, folders[city_name]):
+            return folders[city_name]
+        _forget_folder(parent_id, city_name)
+
+    # Not in the index (or gone): the folder may have been created or recreated since the last listing
     safe_name = _escape_drive_query_value(city_name)
-    q = f"name = '{safe_name}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+    q = f"name = '{safe_name}' and mimeType='{FOLDER_MIME}' and trashed=false"
     if parent_id:
         q += f" and '{parent_id}' in parents"
 
-    results = service.files().list(q=q, spaces='drive', fields='files(id,name)').execute()
+    results = execute(service.files().list(q=q, spaces='drive', fields='files(id,name)'))
     items = results.get('files', [])
-    if items:
-        return items[0]['id']
-
-    file_metadata = {'name': city_name, 'mimeType': 'application/vnd.google-apps.folder'}
-    if parent_id:
-        file_metadata['parents'] = [parent_id]
-    folder = service.files().create(body=file_metadata, fields='id').execute()
-    return folder.get('id')
+    folder_id = items[0]['id'] if items else _create_folder(service, city_name, parent_id)
+    _verified[folder_id] = time.time()
+    _remember_folder(parent_id, city_name, folder_id)
+    return folder_id
 
 def upload_file_to_folder(file_path, folder_id, make_public=False):
     """
@@ -38,8 +148,10 @@ def upload_file_to_folder(file_path, folder_id, make_public=False):
         'name': os.path.basename(file_path),
         'parents': [folder_id]
     }
-    media = MediaFileUpload(file_path, resumable=True)
-    file = service.files().create(body=file_metadata, media_body=media, fields='id,webViewLink,webContentLink').execute()
+    media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    resume_key = f"{folder_id}/{file_metadata['name']}/{os.path.getsize(file_path)}/{int(os.path.getmtime(file_path))}"
+    file = upload_chunked(service.files().create(body=file_metadata, media_body=media, fields='id,webViewLink,webContentLink'),
+                          resume_key=resume_key)
 
     if make_public:
         try:
@@ -50,3 +162,119 @@ def upload_file_to_folder(file_path, folder_id, make_public=False):
 
     # return file metadata
     return file
+
+# -------------------- Chunked resumable uploads --------------------
+def _load_sessions():
+    sessions = read_json(cache_path(UPLOAD_SESSIONS_FILE), {}) or {}
+    now = time.time()
+    return {k: v for k, v in sessions.items() if now - v.get('started_at', 0) < UPLOAD_SESSION_TTL}
+
+def _set_session(resume_key, uri):
+    with _sessions_lock:
+        sessions = _load_sessions()
+        if uri is None:
+            if sessions.pop(resume_key, None) is None:
+                return
+        else:
+            sessions[resume_key] = {'uri': uri, 'started_at': sessions.get(resume_key, {}).get('started_at', time.time())}
+        write_json(cache_path(UPLOAD_SESSIONS_FILE), sessions)
+
+def saved_upload_session(resume_key):
+    """
+    Persisted resumable session URI for resume_key, or None.
+    """
+    with _sessions_lock:
+        return _load_sessions().get(resume_key, {}).get('uri')
+
+# The only place that sets googleapiclient internals. HttpRequest.next_chunk() (google-api-python-client
+# 2.x, checked against 2.201) starts a new upload session when resumable_uri is None, and when
+# _in_error_state is set it first asks Drive how many bytes it holds and resumes from there.
+# requirements.txt keeps the client below 3.0; re-check this before raising that bound.
+def _set_upload_session(request, uri, query_status):
+    """
+    Point a resumable request at session uri (None: start a new session from byte 0).
+    query_status: re-query the session's progress from Drive before the next chunk.
+    """
+    request.resumable_uri = uri
+    if uri is None:
+        request.resumable_progress = 0
+    request._in_error_state = query_status
+
+def _next_chunk(request):
+    # a pooled connection is held for one chunk, not across retries and backoff
+    generation, http = checkout_http()
+    try:
+        return request.next_chunk(http=http)
+    finally:
+        checkin_http(generation, http)
+
+def _chunk_error_retryable(exc):
+    if isinstance(exc, HttpError):
+        return int(getattr(exc.resp, 'status', 0) or 0) in (429, 500, 502, 503, 504)
+    return isinstance(exc, (OSError, socket.timeout, httplib2.HttpLib2Error))
+
+def upload_chunked(request, resume_key=None, progress=None, retries=CHUNK_RETRIES):
+    """
+    Drive a resumable files().create/update request chunk by chunk with next_chunk().
+
+    The session URI is persisted under resume_key (e.g. folder/name/md5) as soon as
+    Drive issues it, so an upload interrupted by a dropped connection, or by a
+    restart of the app, continues from the last byte Drive acknowledged instead of
+    from zero. progress(sent_bytes, total_bytes) is called after every chunk.
+    Returns the created/updated file resource.
+    """
+    total = request.resumable.size()
+    uri = saved_upload_session(resume_key) if resume_key else None
+    if uri:
+        # ask Drive how much it already has before sending the next chunk
+        _set_upload_session(request, uri, query_status=True)
+
+    response = None
+    failures = 0
+    while response is None:
+        try:
+            status, response = _next_chunk(request)
+        except HttpError as e:
+            code = int(getattr(e.resp, 'status', 0) or 0)
+            if code in (404, 410) and request.resumable_uri:
+                # the session expired or was never valid: start a new one
+                if resume_key:
+                    _set_session(resume_key, None)
+                _set_upload_session(request, None, query_status=False)
+                continue
+            if failures >= retries or not _chunk_error_retryable(e):
+                raise
+            failures += 1
+            _set_upload_session(request, request.resumable_uri, query_status=True)
+            time.sleep(min(32, 2 ** failures))
+            continue
+        except Exception as e:
+            if failures >= retries or not _chunk_error_retryable(e) or not request.resumable_uri:
+                raise
+            failures += 1
+            _set_upload_session(request, request.resumable_uri, query_status=True)
+            time.sleep(min(32, 2 ** failures))
+            continue
+        failures = 0
+        if resume_key and request.resumable_uri and request.resumable_uri != uri:
+            uri = request.resumable_uri
+            _set_session(resume_key, uri)
+        if status is not None and progress:
+            progress(status.resumable_progress, total)
+
+    if resume_key:
+        _set_session(resume_key, None)
+    if progress:
+        progress(total, total)
+    return response
+
+def upload_stream_to_folder(stream, filename, folder_id, mimetype='application/octet-stream', chunk_size=UPLOAD_CHUNK_SIZE,
+                            resume_key=None, progress=None, fields='id,name,webViewLink,webContentLink'):
+    """
+    Upload a binary file object to folder_id in chunks of chunk_size bytes without reading it into memory.
+    See upload_chunked for resume_key and progress.
+    """
+    media = MediaIoBaseUpload(stream, mimetype=mimetype, chunksize=chunk_size, resumable=True)
+    body = {'name': filename, 'parents': [folder_id]}
+    request = get_drive_service().files().create(body=body, media_body=media, fields=fields)
+    return upload_chunked(request, resume_key=resume_key, progress=progress)
@@ -0,0 +1,146 @@
+# emissions_engine.py
+"""
+Turns CAP activity data into sector GHG emissions (tCO2e/year).
+
+Factors live in a versioned table; every computed city records the factor
+version it used. compute_table() evaluates all cities at once as NumPy column
+arithmetic over city_table, recalculate_city() recomputes only the sectors fed
+by the CAP section that changed, and recalculate_all() re-runs the whole state
+after a factor update in a single store transaction.
+"""
+import os
+import numpy as np
+import pandas as pd
+import city_store
+import city_table
+
+# Default factors. Each version is immutable once published; add a new version instead of editing.
+EMISSION_FACTORS = {
+    "IN-2023.1": {
+        # Indian grid weighted-average emission factor (CEA CO2 baseline database), tCO2/kWh
+        "grid_tco2_per_kwh": 0.000716,
+        # Mixed municipal solid waste sent to dumpsite/landfill, tCO2e per tonne not recycled
+        "msw_tco2e_per_t": 0.5,
+        # Electricity used to pump, treat and distribute one megalitre of water, kWh/ML
+        "water_kwh_per_ml": 500.0,
+        # Vehicle kilometres travelled per resident per year, km
+        "vkt_per_capita_km": 2000.0,
+    },
+}
+FACTORS_VERSION = os.environ.get("EMISSION_FACTORS_VERSION", max(EMISSION_FACTORS))
+if FACTORS_VERSION not in EMISSION_FACTORS:
+    raise ValueError(f"EMISSION_FACTORS_VERSION={FACTORS_VERSION!r} is not a known factor version "
+                     f"({', '.join(sorted(EMISSION_FACTORS))})")
+
+# Which record sections feed which GHG sector (for incremental recalculation);
+# "Population" (Add/Update City) is the fallback when Basic Info has no population
+SECTOR_INPUTS = {
+    "Buildings": ("Energy_Buildings",),
+    "Industry": ("Energy_Buildings",),
+    "Energy": ("Energy_Buildings",),
+    "Transport": ("Mobility", "Basic Info", "Population"),
+    "Waste": ("Waste",),
+    "Water": ("Water",),
+}
+
+def _col(df, name):
+    return df[name].astype("float64").to_numpy()
+
+def compute_table(table, version=FACTORS_VERSION):
+    """
+    Sector tCO2e for every row of a city_table frame, as a DataFrame (rows: cities, columns: sectors).
+    A sector is NaN for a city whose inputs for that sector are all missing.
+    """
+    f = EMISSION_FACTORS[version]
+    grid = f["grid_tco2_per_kwh"]
+    fossil_share = 1.0 - np.nan_to_num(_col(table, "Energy_Renewable_Share")) / 100.0
+
+    residential = _col(table, "Energy_Residential_kWh")
+    commercial = _col(table, "Energy_Commercial_kWh")
+    buildings = np.where(np.isnan(residential) & np.isnan(commercial), np.nan,
+                         np.nan_to_num(residential) + np.nan_to_num(commercial))
+
+    population = _col(table, "Basic_Population")
+    population = np.where(np.isnan(population) | (population <= 0), _col(table, "Population_Total"), population)
+    vehicle_g_km = _col(table, "Mobility_Vehicle_gCO2_km")
+
+    waste_t = _col(table, "Waste_Total_t")
+    recycled = np.nan_to_num(_col(table, "Waste_Recycled")) / 100.0
+
+    result = {
+        "Buildings": buildings * grid * fossil_share,
+        "Industry": _col(table, "Energy_Industrial_kWh") * grid * fossil_share,
+        "Energy": _col(table, "Energy_Public_kWh") * grid * fossil_share,
+        "Transport": population * f["vkt_per_capita_km"] * vehicle_g_km / 1e6,
+        "Waste": waste_t * (1.0 - recycled) * f["msw_tco2e_per_t"],
+        "Water": _col(table, "Water_Consumption_ML") * f["water_kwh_per_ml"] * grid,
+    }
+    return pd.DataFrame(result, index=table.index).round(2)
+
+def compute_record(record, version=FACTORS_VERSION):
+    """
+    {sector: tCO2e} for a single city record (sectors without inputs are left out).
+    """
+    frame = city_table.build_table({"_": record}).loc[["_"]]
+    row = compute_table(frame, version).iloc[0]
+    return {s: float(v) for s, v in row.items() if not np.isnan(v)}
+
+def _merged_ghg(record, computed, sectors, version):
+    """
+    The record with the computed sectors merged into GHG and the factor version recorded.
+    Returns the record itself when nothing would change (no inputs, same values and version).
+    """
+    current = record.get("GHG") or {}
+    ghg = dict(current)
+    for s in sectors:
+        if s in computed:
+            ghg[s] = computed[s]
+    if ghg == current and (not ghg or record.get("GHG_Factors") == version):
+        return record
+    return dict(record, GHG=ghg, GHG_Factors=version)
+
+def _sectors_for(sections):
+    return [s for s, inputs in SECTOR_INPUTS.items() if sections is None or set(inputs) & set(sections)]
+
+def with_ghg(record, sections=None, version=FACTORS_VERSION):
+    """
+    The record with the GHG sectors fed by the given CAP sections recomputed (None: all sectors).
+    Lets a caller save edited inputs and their emissions in one write.
+    """
+    sectors = _sectors_for(sections)
+    if not sectors:
+        return record
+    return _merged_ghg(record, compute_record(record, version), sectors, version)
+
+def recalculate_city(name, sections=None, version=FACTORS_VERSION):
+    """
+    Recompute a city's GHG after CAP inputs changed. sections: the CAP sections that
+    were edited (only the sectors they feed are recomputed); None recomputes all.
+    Returns the city's new GHG dict.
+    """
+    record = city_store.get_city(name)
+    updated = with_ghg(record, sections, version)
+    if updated != record:
+        city_store.save_city(name, updated)
+    return updated.get("GHG", {})
+
+def recalculate_all(version=FACTORS_VERSION):
+    """
+    Recompute every city's GHG with one vectorised pass and save the changed records together.
+    Returns the number of cities updated.
+    """
+    records = city_store.all_cities()
+    names = [c for c in records]
+    if not names:
+        return 0
+    computed = compute_table(city_table.get_table().loc[names], version)
+    changed = {}
+    for name in names:
+        row = computed.loc[name]
+        values = {s: float(v) for s, v in row.items() if not np.isnan(v)}
+        updated = _merged_ghg(records[name], values, list(SECTOR_INPUTS), version)
+        if updated != records[name]:
+            changed[name] = updated
+    if changed:
+        city_store.save_cities(changed)
+    return len(changed)
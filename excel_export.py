@@ -0,0 +1,142 @@
+# excel_export.py
+"""
+Multi-sheet Excel export of the CAP dataset.
+
+city_workbook_bytes() writes one city's CAP sections as typed sheets;
+state_workbook_bytes() writes one row per city for every section. Both use
+xlsxwriter in constant_memory mode: rows are streamed to disk as they are
+written, so a statewide multi-year export never holds every cell in memory.
+"""
+import math
+import datetime
+from io import BytesIO
+from cap_report import SECTIONS, RCP_YEARS
+from city_table import GHG_SECTORS
+
+WORKBOOK_OPTIONS = {"constant_memory": True, "strings_to_numbers": False, "strings_to_urls": False}
+MAX_SHEET_NAME = 31
+
+def city_workbook_filename(city_name):
+    return f"{city_name}_CAP_data.xlsx"
+
+def state_workbook_filename():
+    return f"Maharashtra_CAP_data_{datetime.date.today():%Y%m%d}.xlsx"
+
+def _cell(value):
+    """
+    Value as written to a cell: numbers stay numbers (NaN/inf become blank), lists are joined,
+    document references become their name.
+    """
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    if isinstance(value, list):
+        return ", ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return value.get("name") or ""
+    return str(value)
+
+def _header(unit, label):
+    return f"{label} ({unit})" if unit else label
+
+class _Writer:
+    """
+    Thin row writer over an xlsxwriter workbook that picks the cell type per value.
+    """
+    def __init__(self, buf):
+        import xlsxwriter
+        self.book = xlsxwriter.Workbook(buf, WORKBOOK_OPTIONS)
+        self.bold = self.book.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+        self.number = self.book.add_format({"num_format": "#,##0.##"})
+        self.wrap = self.book.add_format({"text_wrap": True, "valign": "top"})
+
+    def sheet(self, name, headers, widths=None):
+        ws = self.book.add_worksheet(name[:MAX_SHEET_NAME])
+        ws.write_row(0, 0, headers, self.bold)
+        ws.freeze_panes(1, 1)
+        for col, width in enumerate(widths or [22] * len(headers)):
+            ws.set_column(col, col, width)
+        return ws
+
+    def row(self, ws, r, values):
+        for c, v in enumerate(values):
+            v = _cell(v)
+            if v is None or v == "":
+                continue
+            if isinstance(v, (int, float)):
+                ws.write_number(r, c, v, self.number)
+            else:
+                ws.write_string(r, c, v, self.wrap if len(v) > 40 else None)
+
+    def close(self):
+        self.book.close()
+
+def city_workbook_bytes(city_name, city_data):
+    """
+    One city's CAP data as an .xlsx (bytes): a Field/Value/Unit sheet per CAP section,
+    plus GHG (sector, tCO2e) and RCP (year, °C) sheets.
+    """
+    buf = BytesIO()
+    w = _Writer(buf)
+    for key, (title, fields) in SECTIONS.items():
+        section = city_data.get(key) or {}
+        ws = w.sheet(title, ["Field", "Value", "Unit"], [40, 60, 14])
+        r = 1
+        for field, label, unit in fields:
+            if field == "CAP_Status" and field not in section:
+                value = city_data.get("CAP_Status")
+            else:
+                value = section.get(field)
+            w.row(ws, r, [label, value, unit])
+            r += 1
+        if section.get("Upload"):
+            w.row(ws, r, ["Supporting Document", section["Upload"], ""])
+
+    ws = w.sheet("GHG", ["Sector", "tCO2e"])
+    ghg = city_data.get("GHG") or {}
+    for r, sector in enumerate(GHG_SECTORS, start=1):
+        w.row(ws, r, [sector, ghg.get(sector)])
+
+    ws = w.sheet("RCP", ["Year", "Temperature Change (°C)"])
+    rcp = (city_data.get("Climate_Data") or {}).get("RCP")
+    rcp = rcp if isinstance(rcp, list) and len(rcp) == len(RCP_YEARS) else [None] * len(RCP_YEARS)
+    for r, (year, value) in enumerate(zip(RCP_YEARS, rcp), start=1):
+        w.row(ws, r, [year, value])
+    w.close()
+    return buf.getvalue()
+
+def state_workbook_bytes(records, city_names=None):
+    """
+    Statewide workbook (bytes) for {city: record}: one sheet per CAP section with one row
+    per city, plus GHG (city x sector) and RCP (city x year) sheets.
+    city_names fixes the row order (default: the records' order).
+    """
+    names = list(city_names) if city_names is not None else list(records)
+    buf = BytesIO()
+    w = _Writer(buf)
+    for key, (title, fields) in SECTIONS.items():
+        ws = w.sheet(title, ["City"] + [_header(unit, label) for _, label, unit in fields] + ["Supporting Document"])
+        for r, name in enumerate(names, start=1):
+            record = records.get(name) or {}
+            section = record.get(key) or {}
+            values = [record.get("CAP_Status") if f == "CAP_Status" and f not in section else section.get(f)
+                      for f, _, _ in fields]
+            w.row(ws, r, [name] + values + [section.get("Upload")])
+
+    ws = w.sheet("GHG", ["City"] + [f"{s} (tCO2e)" for s in GHG_SECTORS] + ["Total (tCO2e)"])
+    for r, name in enumerate(names, start=1):
+        ghg = (records.get(name) or {}).get("GHG") or {}
+        values = [ghg.get(s) if isinstance(ghg.get(s), (int, float)) and math.isfinite(ghg.get(s)) else None
+                  for s in GHG_SECTORS]
+        total = sum(v for v in values if v is not None) if any(v is not None for v in values) else None
+        w.row(ws, r, [name] + values + [total])
+
+    ws = w.sheet("RCP", ["City"] + [str(y) for y in RCP_YEARS], [22] + [8] * len(RCP_YEARS))
+    for r, name in enumerate(names, start=1):
+        rcp = ((records.get(name) or {}).get("Climate_Data") or {}).get("RCP")
+        w.row(ws, r, [name] + (rcp if isinstance(rcp, list) and len(rcp) == len(RCP_YEARS) else []))
+    w.close()
+    return buf.getvalue()
@@ -1,33 +1,117 @@
 # export_city_files.py (optional improvement)
 import pandas as pd
 from fpdf import FPDF
+from fpdf.enums import XPos, YPos
 import os
+import json
+import hashlib
 import tempfile
+from io import BytesIO
 
-def generate_ghg_excel(city_name, city_data):
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PDF_MIME = "application/pdf"
+# Bump when the layout of the generated files changes, so unchanged inputs are re-uploaded once
+GHG_ARTIFACT_VERSION = "1"
+
+def ghg_excel_filename(city_name):
+    return f"{city_name}_ghg_inventory.xlsx"
+
+def ghg_pdf_filename(city_name):
+    return f"{city_name}_ghg_inventory.pdf"
+
+def _pdf_bytes(pdf):
+    """
+    Render an fpdf2 document to bytes.
+    """
+    return bytes(pdf.output())
+
+def generate_ghg_excel_bytes(city_name, city_data):
+    """
+    Build the GHG inventory workbook in memory. Returns a BytesIO positioned at 0.
+    """
     ghg_data = city_data.get("GHG", {})
     if not ghg_data:
         df = pd.DataFrame([{"message": "No GHG data available"}])
     else:
         df = pd.DataFrame([ghg_data])
-    fd, file_name = tempfile.mkstemp(suffix=f"_{city_name}_ghg_inventory.xlsx")
-    os.close(fd)
-    df.to_excel(file_name, index=False)
-    return file_name
+    buf = BytesIO()
+    df.to_excel(buf, index=False)
+    buf.seek(0)
+    return buf
 
-def generate_ghg_pdf(city_name, city_data):
+def generate_ghg_pdf_bytes(city_name, city_data):
+    """
+    Build the GHG inventory PDF in memory. Returns a BytesIO positioned at 0.
+    """
     pdf = FPDF()
     pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"{city_name} - GHG Inventory", ln=True, align='C')
+    pdf.set_font("Helvetica", size=12)
+    pdf.cell(200, 10, text=f"{city_name} - GHG Inventory", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
     pdf.ln(10)
     ghg_data = city_data.get("GHG", {})
     if not ghg_data:
-        pdf.cell(200, 10, txt="No GHG data available", ln=True)
+        pdf.cell(200, 10, text="No GHG data available", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
     else:
         for k, v in ghg_data.items():
-            pdf.cell(200, 10, txt=f"{k}: {v}", ln=True)
-    fd, file_name = tempfile.mkstemp(suffix=f"_{city_name}_ghg_inventory.pdf")
-    os.close(fd)
-    pdf.output(file_name)
+            pdf.cell(200, 10, text=f"{k}: {v}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    return BytesIO(_pdf_bytes(pdf))
+
+def _write_temp(buf, suffix):
+    fd, file_name = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, "wb") as f:
+        f.write(buf.getvalue())
     return file_name
+
+def generate_ghg_excel(city_name, city_data):
+    """
+    Write the GHG workbook to a temp file and return its path (prefer generate_ghg_excel_bytes).
+    """
+    return _write_temp(generate_ghg_excel_bytes(city_name, city_data), f"_{city_name}_ghg_inventory.xlsx")
+
+def generate_ghg_pdf(city_name, city_data):
+    """
+    Write the GHG PDF to a temp file and return its path (prefer generate_ghg_pdf_bytes).
+    """
+    return _write_temp(generate_ghg_pdf_bytes(city_name, city_data), f"_{city_name}_ghg_inventory.pdf")
+
+def ghg_artifacts_key(city_name, city_data):
+    """
+    Hash of everything the GHG files are generated from. The files themselves embed
+    timestamps, so this (not the file bytes) decides whether they need re-uploading.
+    """
+    payload = json.dumps([GHG_ARTIFACT_VERSION, city_name, city_data.get("GHG", {})], sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def generate_ghg_artifacts(city_name, city_data):
+    """
+    Build both GHG artifacts in memory.
+    Returns [(filename, bytes, mimetype, content_key), ...] ready for upload or download.
+    """
+    key = ghg_artifacts_key(city_name, city_data)
+    return [
+        (ghg_pdf_filename(city_name), generate_ghg_pdf_bytes(city_name, city_data).getvalue(), PDF_MIME, key),
+        (ghg_excel_filename(city_name), generate_ghg_excel_bytes(city_name, city_data).getvalue(), XLSX_MIME, key),
+    ]
+
+def city_data_key(city_name, city_data):
+    """
+    Hash of the full city record (content key of the CAP data workbook).
+    """
+    payload = json.dumps([GHG_ARTIFACT_VERSION, city_name, city_data], sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+def generate_city_artifacts(city_name, city_data):
+    """
+    GHG artifacts plus the full CAP report (see cap_report) and the CAP data workbook
+    (see excel_export), as [(filename, bytes, mimetype, content_key), ...].
+    """
+    import cap_report
+    import excel_export
+    from json_utils import to_jsonable
+    report = cap_report.generate_cap_report_bytes(city_name, city_data)
+    record = to_jsonable(city_data)
+    return generate_ghg_artifacts(city_name, city_data) + [
+        (cap_report.report_filename(city_name), report, PDF_MIME, cap_report.report_key(city_name, city_data)),
+        (excel_export.city_workbook_filename(city_name), excel_export.city_workbook_bytes(city_name, record),
+         XLSX_MIME, city_data_key(city_name, record)),
+    ]
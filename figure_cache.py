@@ -0,0 +1,50 @@
+# figure_cache.py
+"""
+Process-wide cache of Plotly figures keyed by (chart type, city, data version).
+
+Figures are built once per key, so reruns, sidebar clicks and city switches
+reuse them. Entries for a city are dropped as soon as that city's record is saved.
+"""
+import threading
+from collections import OrderedDict
+import city_store
+
+MAX_FIGURES = 512
+STATIC = "static"   # version for charts that do not depend on city data
+
+_lock = threading.Lock()
+_figures = OrderedDict()   # (chart, city, version) -> figure
+
+def get_figure(chart, city, version, build):
+    """
+    Cached figure for (chart, city, version); build() is only called on a miss.
+    Shared across sessions: do not mutate the returned figure.
+    """
+    key = (chart, city, version)
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            return _figures[key]
+    fig = build()
+    with _lock:
+        _figures[key] = fig
+        while len(_figures) > MAX_FIGURES:
+            _figures.popitem(last=False)
+    return fig
+
+def invalidate(city=None):
+    """
+    Drop cached figures for one city (statewide figures use city=None), or everything if city is omitted.
+    """
+    with _lock:
+        if city is None:
+            _figures.clear()
+            return
+        for key in [k for k in _figures if k[1] in (city, None) and k[2] != STATIC]:
+            del _figures[key]
+
+def _on_save(name, record, version):
+    # the city's own charts and the statewide charts are now stale
+    invalidate(name)
+
+city_store.subscribe(_on_save)
@@ -2,11 +2,27 @@
 import os
 import json
 import base64
+import queue
+import threading
+import httplib2
 import streamlit as st
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 
 SCOPES = ["https://www.googleapis.com/auth/drive"]
+HTTP_TIMEOUT = int(os.environ.get("DRIVE_HTTP_TIMEOUT", "60"))
+HTTP_POOL_SIZE = int(os.environ.get("DRIVE_HTTP_POOL_SIZE", "16"))
+
+# Process-wide client state (Streamlit re-runs the script, not imported modules)
+_client_lock = threading.Lock()
+# Keep-alive connections shared by all threads: at most HTTP_POOL_SIZE exist, idle ones wait in the queue
+_http_slots = threading.BoundedSemaphore(HTTP_POOL_SIZE)
+_http_pool = queue.Queue(maxsize=HTTP_POOL_SIZE)   # idle (generation, AuthorizedHttp)
+_credentials = None
+_service = None
+_client_builds = 0
+_generation = 0
 
 def _get_service_account_info_from_secrets():
     """
@@ -56,19 +72,112 @@ def _get_service_account_info_from_secrets():
     return None
 
 
-def get_drive_service():
+def _load_credentials():
     """
-    Build and return an authorized Google Drive v3 service using a Service Account.
+    Resolve service-account credentials from Streamlit secrets or GOOGLE_APPLICATION_CREDENTIALS.
     """
     sa_info = _get_service_account_info_from_secrets()
     if sa_info:
-        creds = service_account.Credentials.from_service_account_info(sa_info, scopes=SCOPES)
-        return build("drive", "v3", credentials=creds, cache_discovery=False)
+        return service_account.Credentials.from_service_account_info(sa_info, scopes=SCOPES)
 
     # fallback: path-based service account
     gpath = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     if gpath and os.path.exists(gpath):
-        creds = service_account.Credentials.from_service_account_file(gpath, scopes=SCOPES)
-        return build("drive", "v3", credentials=creds, cache_discovery=False)
+        return service_account.Credentials.from_service_account_file(gpath, scopes=SCOPES)
 
     raise RuntimeError("No usable service account found. Set SERVICE_ACCOUNT_JSON or SERVICE_ACCOUNT_JSON_BASE64 in Streamlit secrets, or GOOGLE_APPLICATION_CREDENTIALS env var.")
+
+
+def get_credentials():
+    """
+    Return the process-wide credentials, loading them on first use.
+    The token is refreshed lazily by AuthorizedHttp only once it has expired.
+    """
+    global _credentials
+    with _client_lock:
+        if _credentials is None:
+            _credentials = _load_credentials()
+        return _credentials
+
+
+def checkout_http():
+    """
+    Take a keep-alive AuthorizedHttp from the process-wide pool (blocks while
+    HTTP_POOL_SIZE are checked out). httplib2 connections are not thread-safe,
+    so a connection is used by one thread at a time; return it with checkin_http().
+    Returns (generation, http).
+    """
+    _http_slots.acquire()
+    try:
+        while True:
+            try:
+                generation, http = _http_pool.get_nowait()
+            except queue.Empty:
+                break
+            if generation == _generation:
+                return generation, http
+            # built with credentials dropped by reset_drive_service()
+        return _generation, AuthorizedHttp(get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    except BaseException:
+        _http_slots.release()
+        raise
+
+def checkin_http(generation, http):
+    """
+    Return a connection taken with checkout_http(); stale ones are dropped.
+    """
+    try:
+        if generation == _generation:
+            _http_pool.put_nowait((generation, http))
+    except queue.Full:
+        pass
+    finally:
+        _http_slots.release()
+
+
+def get_drive_service():
+    """
+    Return the process-wide authorized Google Drive v3 service.
+    The discovery object is built once per process; use execute() to run its
+    requests over a pooled connection.
+    """
+    global _service, _client_builds
+    if _service is not None:
+        return _service
+    creds = get_credentials()
+    with _client_lock:
+        if _service is None:
+            http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            _service = build("drive", "v3", http=http, cache_discovery=False)
+            _client_builds += 1
+        return _service
+
+
+def execute(request, num_retries=0):
+    """
+    Execute a googleapiclient request over a connection checked out of the pool.
+    """
+    generation, http = checkout_http()
+    try:
+        return request.execute(http=http, num_retries=num_retries)
+    finally:
+        checkin_http(generation, http)
+
+
+def get_client_build_count():
+    """
+    Number of Drive clients built in this process (expected: 1).
+    """
+    return _client_builds
+
+
+def reset_drive_service():
+    """
+    Drop cached credentials and client, e.g. after rotating the service-account secret.
+    Pooled connections built with the old credentials are discarded as they are checked out or in.
+    """
+    global _credentials, _service, _generation
+    with _client_lock:
+        _credentials = None
+        _service = None
+        _generation += 1
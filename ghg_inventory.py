@@ -0,0 +1,134 @@
+# ghg_inventory.py
+"""
+GHG inventory: tCO2e per (city, sector, year) in an indexed SQLite table.
+
+Rows are written whenever a city record with GHG values is saved, inside the
+city store's save transaction (see city_store.subscribe_transaction). Sector views
+are computed as vectorised pandas queries over the whole table and cached per
+inventory version, so the admin GHG Inventory tab renders the same stable
+result on every rerun.
+"""
+import re
+import sqlite3
+import datetime
+import threading
+import pandas as pd
+import city_store
+from city_list import cities
+
+_lock = threading.RLock()
+_conn = None
+_version = 0            # bumped on every write from this process
+_db_version = None      # PRAGMA data_version seen with _frame
+_frame = None           # full inventory, columns city/sector/year/tco2e
+_views = {}             # (sector, year, version) -> DataFrame
+_backfilled = False
+
+def _connect():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(city_store.DB_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("""CREATE TABLE IF NOT EXISTS ghg_inventory (
+                             city TEXT NOT NULL,
+                             sector TEXT NOT NULL,
+                             year INTEGER NOT NULL,
+                             tco2e REAL NOT NULL,
+                             PRIMARY KEY (city, sector, year))""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS ghg_inventory_sector_year ON ghg_inventory (sector, year)")
+    return _conn
+
+def reporting_year(record):
+    """
+    Inventory year of a city record: GHG_Year if set, else the year of Basic Info "Last_Updated", else this year.
+    """
+    year = record.get("GHG_Year")
+    if isinstance(year, int):
+        return year
+    m = re.search(r"(19|20)\d{2}", str(record.get("Basic Info", {}).get("Last_Updated", "")))
+    return int(m.group(0)) if m else datetime.date.today().year
+
+def _write_rows(conn, city, year, values):
+    global _version
+    rows = [(city, sector, int(year), float(v)) for sector, v in values.items()
+            if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    conn.execute("DELETE FROM ghg_inventory WHERE city = ? AND year = ?", (city, int(year)))
+    conn.executemany("INSERT INTO ghg_inventory (city, sector, year, tco2e) VALUES (?, ?, ?, ?)", rows)
+    with _lock:
+        _version += 1
+
+def record_inventory(city, year, values):
+    """
+    Replace a city's inventory for one year with {sector: tCO2e}.
+    """
+    with _lock:
+        conn = _connect()
+        conn.execute("BEGIN")
+        try:
+            _write_rows(conn, city, year, values)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+def _on_save(conn, name, record):
+    # runs inside city_store's save transaction, on its connection
+    if isinstance(record.get("GHG"), dict):
+        _write_rows(conn, name, reporting_year(record), record["GHG"])
+
+_connect()   # the table must exist before the first save writes to it
+city_store.subscribe_transaction(_on_save)
+
+def _backfill():
+    """
+    One-time load of GHG values already in the store (e.g. records saved before this table existed).
+    """
+    global _backfilled
+    if _backfilled:
+        return
+    for name, record in list(city_store.all_cities().items()):
+        if isinstance(record.get("GHG"), dict):
+            record_inventory(name, reporting_year(record), record["GHG"])
+    _backfilled = True
+
+def inventory_version():
+    """
+    Changes whenever the inventory is written, by this process or another one.
+    """
+    with _lock:
+        return (_version, _connect().execute("PRAGMA data_version").fetchone()[0])
+
+def get_inventory():
+    """
+    The full inventory as a DataFrame (city, sector, year, tco2e), reloaded only after writes.
+    """
+    global _frame, _db_version
+    _backfill()
+    with _lock:
+        version = inventory_version()
+        if _frame is None or _db_version != version:
+            _frame = pd.read_sql_query("SELECT city, sector, year, tco2e FROM ghg_inventory", _connect())
+            _db_version = version
+            _views.clear()
+        return _frame
+
+def years():
+    """
+    Inventory years available, newest first.
+    """
+    return sorted(get_inventory()["year"].unique().tolist(), reverse=True)
+
+def sector_view(sector, year=None):
+    """
+    tCO2e for one sector and year across all cities, as DataFrame[City, tCO2e]
+    in city-list order (NaN where a city has not reported). Cached per inventory version.
+    """
+    frame = get_inventory()
+    with _lock:
+        if year is None:
+            year = max(frame["year"], default=datetime.date.today().year)
+        key = (sector, int(year), _db_version)
+        if key not in _views:
+            sel = frame[(frame["sector"] == sector) & (frame["year"] == int(year))]
+            values = sel.set_index("city")["tco2e"].reindex(cities)
+            _views[key] = pd.DataFrame({"City": cities, "tCO2e": values.to_numpy()})
+        return _views[key]
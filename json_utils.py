@@ -0,0 +1,19 @@
+# json_utils.py
+import json
+
+def _json_default(o):
+    # Uploaded files and other non-JSON values are stored by name only
+    name = getattr(o, "name", None)
+    return {"name": name, "size": getattr(o, "size", None)} if name else None
+
+def to_jsonable(obj):
+    """
+    Plain-JSON copy of obj (uploaded files and other non-JSON values replaced via _json_default).
+    """
+    return json.loads(json.dumps(obj, ensure_ascii=False, default=_json_default))
+
+def stable_json_bytes(obj, indent=2):
+    """
+    Deterministic JSON encoding (sorted keys) so identical content hashes identically.
+    """
+    return json.dumps(obj, ensure_ascii=False, indent=indent, sort_keys=True, default=_json_default).encode("utf-8")
@@ -0,0 +1,47 @@
+# local_cache.py
+import os
+import json
+import tempfile
+
+CACHE_DIR = os.environ.get("MAHACAP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".mahacap_cache"))
+
+def cache_path(*parts):
+    """
+    Return a path inside the local cache directory, creating parent folders as needed.
+    """
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def read_json(path, default=None):
+    """
+    Read a JSON cache file, returning default if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+def write_json(path, data):
+    """
+    Atomically write a JSON cache file (write to temp file, then rename).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,9 +1,6 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 import datetime
+import os
 
 # -------------------- Page Config --------------------
 st.set_page_config(
@@ -19,22 +16,95 @@ def format_inr(value):
 def last_updated():
     return datetime.datetime.now().strftime("%B %Y")
 
+def parent_folder_id():
+    # Try Streamlit secrets first (Streamlit Cloud), fallback to environment variable or None
+    try:
+        return st.secrets.get("PARENT_FOLDER_ID")
+    except Exception:
+        return os.environ.get("PARENT_FOLDER_ID")
+
 # -------------------- Data Storage --------------------
-if 'city_data' not in st.session_state:
-    st.session_state.city_data = {}
+# City data is shared by all sessions through the process-wide store (not session_state).
+# Public pages only need these light modules; pandas/plotly express, the Drive client and the
+# PDF/Excel stacks are imported where the admin panel uses them (see admin_warmup).
+import city_store
+import city_snapshot
+import public_bundle
+
+# A fresh server starts from the local Parquet snapshot (once per process) instead of per-city
+# Drive loads; load_city_from_drive() later replaces seeded records with newer Drive state
+try:
+    city_snapshot.seed_store()
+except Exception:
+    pass
+
+def save_cap_section(city, section, values):
+    """
+    Save one CAP section together with the GHG sectors that depend on it (a single store write).
+    """
+    import emissions_engine
+    record = city_store.get_city(city)
+    if "Upload" in values:
+        values = dict(values, Upload=store_document(city, values["Upload"], record.get(section, {}).get("Upload")))
+    record[section] = values
+    city_store.save_city(city, emissions_engine.with_ghg(record, sections=[section]))
+
+def store_document(city, upload, previous=None):
+    """
+    Stream a newly attached document to the city's Drive folder and return its reference
+    (file id, size, md5) for the city record; keep the previous reference if nothing new was attached.
+    """
+    from document_upload import ingest_document, is_upload, DocumentTooLarge
+    if not is_upload(upload):
+        return previous
+    from drive_upload import get_or_create_folder
+    bar = st.progress(0, text=f"Uploading {upload.name} to Google Drive...")
+    def progress(sent, total):
+        bar.progress(min(1.0, sent / total) if total else 1.0,
+                     text=f"Uploading {upload.name}: {sent / 1e6:.1f} of {total / 1e6:.1f} MB")
+    try:
+        folder_id = get_or_create_folder(city, parent_id=parent_folder_id())
+        return ingest_document(upload, folder_id, progress=progress)
+    except DocumentTooLarge as e:
+        st.error(str(e))
+    except Exception as e:
+        st.warning(f"Could not upload {upload.name} to Google Drive: {e}")
+    return previous
+
+def load_city_from_drive(city):
+    """
+    Load a city's saved state from Drive once per session and city (not on every rerun).
+    The loaded state is remembered in synced_state as the base for the next save, so
+    later saves only send the fields changed since.
+    """
+    loaded = st.session_state.setdefault("drive_loaded_cities", set())
+    if city in loaded:
+        return
+    from state_drive import load_state_cached
+    from drive_upload import get_or_create_folder
+    try:
+        # resolved from the cached folder index after warm-up
+        folder_id = get_or_create_folder(city, parent_id=parent_folder_id())
+        # cached per folder; Drive is only re-read when the state files changed
+        saved = load_state_cached(folder_id)
+        if saved:
+            st.session_state.setdefault("synced_state", {})[city] = saved
+            # seed the shared store once; never overwrite records already edited on this server.
+            # Records that only came from a snapshot seed may be older than Drive: replace them.
+            if not city_store.has_city(city) or city_snapshot.seeded_unchanged(city):
+                city_store.save_city(city, saved)
+                st.info("Loaded saved state for city from Google Drive.")
+        else:
+            st.session_state.setdefault("synced_state", {})[city] = {}
+        loaded.add(city)
+    except Exception as e:
+        # ignore errors, allow app to continue
+        st.warning(f"Could not load saved state for {city}: {e}")
 
 if 'current_page' not in st.session_state:
     st.session_state.current_page = "Home"
 
-cities = ["Mumbai","Kalyan-Dombivli","Mira-Bhayandar","Navi Mumbai","Bhiwandi-Nizampur",
-          "Ulhasnagar","Ambernath Council","Vasai-Virar","Thane","Badlapur Council",
-          "Pune","Pimpri-Chinchwad","Panvel","Malegaon","Nashik","Nandurbar Council",
-          "Bhusawal Council","Jalgaon","Dhule","Ahilyanagar","Chh. Sambhajinagar",
-          "Jalna","Beed Council","Satara Council","Sangli-Miraj-Kupwad","Kolhapur",
-          "Ichalkaranji","Solapur","Barshi Council","Nanded-Waghala","Yawatmal Council",
-          "Dharashiv","Latur","Udgir Coucil","Akola","Parbhani Council","Amravati",
-          "Achalpur Council","Wardha Coumcil","Hinganghat Ciuncil","Nagpur","Chandrapur",
-          "Gondia Council"]
+from city_list import cities
 
 # -------------------- Sidebar --------------------
 def sidebar_section():
@@ -147,13 +217,16 @@ def home_page():
     st.header("Climate Action Plan Dashboard")
     st.caption("Maharashtra's Net Zero Journey")
 
-    status_counts = {"Not Started": 0, "In Progress": 0, "Completed": 0}
-    for c in cities:
-        status = st.session_state.city_data.get(c, {}).get("CAP_Status", "Not Started")
-        if status in status_counts:
-            status_counts[status] += 1
+    # served from the published public bundle when there is one (no per-visit computation),
+    # otherwise from the store's incrementally maintained rollups
+    try:
+        card, figures = public_bundle.home_view()
+    except public_bundle.BundleMissing:
+        # bundle-only mode before the first publish: serve live data rather than a broken page
+        card, figures = public_bundle.home_view(live=True)
+    status_counts = card["status_counts"]
 
-    total_cities = 43
+    total_cities = card["total_cities"]
     st.markdown("### CAP Status Overview")
     cap_status_html = f"""
     <div style="display:flex; gap:15px; margin-bottom:15px;">
@@ -179,18 +252,13 @@ def home_page():
 
     # Maharashtra Basic Info
     st.markdown("### Maharashtra Basic Information")
-    total_population = sum([st.session_state.city_data.get(c, {}).get("Population", {}).get("Total", 0) for c in cities])
-    total_area = sum([st.session_state.city_data.get(c, {}).get("Area", 0) for c in cities])
-    dept_name = dept_email = website = cap_link = cap_status = ""
-    for c in cities:
-        city_info = st.session_state.city_data.get(c, {})
-        if city_info:
-            cap_status = city_info.get("CAP_Status", "Not Started")
-            cap_link = city_info.get("CAP_Link", "")
-            dept_name = city_info.get("Dept_Name", "")
-            dept_email = city_info.get("Dept_Email", "")
-            website = city_info.get("Website", "")
-            break
+    total_population = card["total_population"]
+    total_area = card["total_area"]
+    cap_status = card["cap_status"]
+    cap_link = card["cap_link"]
+    dept_name = card["dept_name"]
+    dept_email = card["dept_email"]
+    website = card["website"]
     basic_info_html = f"""
     <div style="display:grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap:15px;">
         <div style="border-radius:8px; background:#1e1e1e; padding:16px; text-align:center; box-shadow:0 2px 6px rgba(0,0,0,0.5);">
@@ -226,27 +294,19 @@ def home_page():
     st.markdown(basic_info_html, unsafe_allow_html=True)
 
     # --- GHG by Sector ---
-    ghg_sectors = ["Energy", "Transport", "Waste", "Water"]
-    ghg_values = [sum([st.session_state.city_data.get(c, {}).get("GHG", {}).get(s, 0) for c in cities]) for s in ghg_sectors]
-    fig = px.bar(x=ghg_sectors, y=ghg_values, labels={"x":"Sector","y":"tCO2e"}, title="Maharashtra GHG Emissions by Sector", template="plotly_dark")
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(figures["ghg_by_sector"], use_container_width=True)
+
+    # --- Emission Pathways ---
+    st.markdown("### Net Zero Pathways")
+    st.plotly_chart(figures["pathways"], use_container_width=True)
 
     # --- RCP Scenarios ---
     st.markdown("### RCP Scenario Projections")
-    years = list(range(2020,2051))
-    rcp_45 = np.linspace(1.0,2.0,len(years))
-    rcp_60 = np.linspace(1.0,2.5,len(years))
-    rcp_85 = np.linspace(1.0,3.5,len(years))
-    fig2 = px.line(x=years, y=rcp_45, labels={"x":"Year","y":"Temp Rise (°C)"}, title="Projected RCP Scenarios", template="plotly_dark")
-    fig2.add_scatter(x=years, y=rcp_60, mode="lines", name="RCP 6.0")
-    fig2.add_scatter(x=years, y=rcp_85, mode="lines", name="RCP 8.5")
-    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(figures["rcp"], use_container_width=True)
 
     st.markdown(f"<div style='position:fixed; bottom:10px; centre:10px; color:#aaaaaa; font-size:12px;'>Last Updated: {last_updated()}</div>", unsafe_allow_html=True)
 
 # -------------------- City Page --------------------
-import plotly.graph_objects as go  # make sure this is at the top with other imports
-
 def city_page():
     # --- Dark Theme Body ---
     st.markdown("<style>body {background-color: #121212; color: #ffffff;}</style>", unsafe_allow_html=True)
@@ -255,18 +315,21 @@ def city_page():
 
     # Dropdown in alphabetical order
     selected_city = st.selectbox("Select City", sorted(cities), key="city_page_select")
-    city_info = st.session_state.city_data.get(selected_city, {})
+    try:
+        card, figures = public_bundle.city_view(selected_city)
+    except public_bundle.BundleMissing:
+        card, figures = public_bundle.city_view(selected_city, live=True)
 
     st.subheader(f"{selected_city} Net Zero Journey")
 
     # --- Basic Information Cards ---
-    cap_status = city_info.get("CAP_Status", "Not Started")
-    cap_link = city_info.get("CAP_Link", "")
-    population = city_info.get("Basic Info", {}).get("Population", 0)
-    area = city_info.get("Basic Info", {}).get("Area", 0)
-    dept_name = city_info.get("Dept_Name", "")
-    dept_email = city_info.get("Dept_Email", "")
-    website = city_info.get("Website", "")
+    cap_status = card["cap_status"]
+    cap_link = card["cap_link"]
+    population = card["population"]
+    area = card["area"]
+    dept_name = card["dept_name"]
+    dept_email = card["dept_email"]
+    website = card["website"]
 
     basic_info_html = f"""
     <div style="display:grid; grid-template-columns: repeat(auto-fit, minmax(180px, 1fr)); gap:15px; margin-bottom:20px;">
@@ -304,37 +367,18 @@ def city_page():
 
     # --- GHG Emissions by Sector ---
     st.markdown("### GHG Emissions by Sector")
-    ghg_sectors = ["Energy", "Transport", "Waste", "Water", "Buildings", "Industry"]
-    ghg_values = [city_info.get("GHG", {}).get(s, 0) for s in ghg_sectors]
-
-    fig_ghg = px.bar(
-        x=ghg_sectors,
-        y=ghg_values,
-        labels={"x": "Sector", "y": "tCO2e"},
-        title=f"{selected_city} GHG Emissions by Sector",
-        template="plotly_dark"
-    )
-    st.plotly_chart(fig_ghg, use_container_width=True)
+    if "ghg_by_sector" in figures:
+        st.plotly_chart(figures["ghg_by_sector"], use_container_width=True)
 
     # --- RCP Scenario Projections ---
     st.markdown("### RCP Scenario Projections")
-    years = list(range(2020, 2051))
-    rcp_45 = np.linspace(1.0, 2.0, len(years))
-    rcp_60 = np.linspace(1.0, 2.5, len(years))
-    rcp_85 = np.linspace(1.0, 3.5, len(years))
-
-    fig_rcp = go.Figure()
-    fig_rcp.add_trace(go.Scatter(x=years, y=rcp_45, mode="lines", name="RCP 4.5"))
-    fig_rcp.add_trace(go.Scatter(x=years, y=rcp_60, mode="lines", name="RCP 6.0"))
-    fig_rcp.add_trace(go.Scatter(x=years, y=rcp_85, mode="lines", name="RCP 8.5"))
-
-    fig_rcp.update_layout(
-        template="plotly_dark",
-        title=f"{selected_city} RCP Scenario Projections",
-        xaxis_title="Year",
-        yaxis_title="Temp Rise (°C)"
-    )
-    st.plotly_chart(fig_rcp, use_container_width=True)
+    if "rcp" in figures:
+        st.plotly_chart(figures["rcp"], use_container_width=True)
+
+    # --- Emission Pathways ---
+    st.markdown("### Net Zero Pathways")
+    if "pathways" in figures:
+        st.plotly_chart(figures["pathways"], use_container_width=True)
 
     # --- Footer: Last Updated ---
     st.markdown(
@@ -346,6 +390,273 @@ def city_page():
         unsafe_allow_html=True
     )
     
+# -------------------- Generate CAP Sections --------------------
+# Each CAP section is rendered by its own function and only the active one is drawn
+# on a rerun, so the admin form no longer builds every widget of all seven sections.
+# Section inputs sit in an st.form: edits stay in the browser until the section's
+# save button is pressed, which causes one rerun and one store write.
+# Widget keys are scoped per city: Streamlit keeps a keyed widget's value when its
+# value= changes, so shared keys would carry one city's inputs over to the next.
+RCP_YEARS = list(range(2020, 2051))
+RCP_COLUMN = "Temperature Change (°C)"
+UPLOAD_TYPES = ["pdf","xlsx","docx"]
+
+def _saved(section, key, default):
+    """
+    Previously saved value for a widget, or default when missing or of another type.
+    """
+    value = section.get(key, default)
+    if isinstance(value, bool):
+        return default
+    if isinstance(default, float) and isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(default, int) and isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value if isinstance(value, type(default)) else default
+
+def _saved_index(section, key, options):
+    value = section.get(key)
+    return options.index(value) if value in options else 0
+
+def cap_basic_info(city_select, city_info):
+    sec = city_info.get("Basic Info",{})
+    with st.form("cap_basic_info_form"):
+        population = st.number_input("Population", min_value=0, value=_saved(sec, "Population", 0), key=f"{city_select}_cap_pop")
+        area = st.number_input("Area (sq km)", min_value=0, value=_saved(sec, "Area", 0), key=f"{city_select}_cap_area")
+        gdp = st.number_input("GDP (₹ Crores)", min_value=0, value=_saved(sec, "GDP", 0), key=f"{city_select}_cap_gdp")
+        density = st.number_input("Population Density (people/km²)", min_value=0, value=_saved(sec, "Density", 0), key=f"{city_select}_cap_density")
+        climate_zone = st.text_input("Climate Zone", value=_saved(sec, "Climate_Zone", ""), key=f"{city_select}_cap_climate_zone")
+        admin_structure = st.text_input("Administrative Structure", value=_saved(sec, "Admin", ""), key=f"{city_select}_cap_admin_structure")
+        cap_status_options = ["Not Started","In Progress","Completed"]
+        cap_status_form_default = city_info.get("CAP_Status","Not Started")
+        if cap_status_form_default not in cap_status_options:
+            cap_status_form_default = "Not Started"
+        cap_status_form = st.selectbox("CAP Status", cap_status_options, index=cap_status_options.index(cap_status_form_default), key=f"{city_select}_cap_status_form")
+        last_updated_input = st.date_input("Last Updated", datetime.date.today(), key=f"{city_select}_cap_last_updated")
+
+        # New comprehensive fields
+        population_5yr = st.number_input("Projected Population in 5 years", min_value=0, value=_saved(sec, "Population_5yr", 0), key=f"{city_select}_pop_5yr")
+        cap_targets = st.text_area("Overall CAP Goals / Targets (aligned with SDGs/NDCs)", value=_saved(sec, "CAP_Targets", ""), key=f"{city_select}_cap_targets")
+        cap_mer_indicators = st.text_area("Overall MER Indicators for CAP", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_cap_mer")
+        basic_budget_allocation = st.number_input("Budget Allocation for CAP Implementation (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_cap_budget")
+        upload_basic = st.file_uploader("Upload any supporting documents for Basic Info", type=UPLOAD_TYPES, key=f"{city_select}_upload_basic")
+
+        submitted = st.form_submit_button("Save Basic Info Data")
+
+    if submitted:
+        save_cap_section(city_select, "Basic Info", {
+            "Population":population,"Area":area,"GDP":gdp,"Density":density,"Climate_Zone":climate_zone,
+            "Admin":admin_structure,"CAP_Status":cap_status_form,"Last_Updated":last_updated_input.strftime("%B %Y"),
+            "Population_5yr":population_5yr,"CAP_Targets":cap_targets,"MER_Indicators":cap_mer_indicators,
+            "Budget":basic_budget_allocation,"Upload":upload_basic
+        })
+        st.success("Basic Info saved successfully!")
+
+def cap_energy_buildings(city_select, city_info):
+    sec = city_info.get("Energy_Buildings",{})
+    with st.form("cap_energy_buildings_form"):
+        res_energy = st.number_input("Residential Electricity Consumption (kWh/year)", min_value=0, value=_saved(sec, "Residential", 0), key=f"{city_select}_res_energy")
+        com_energy = st.number_input("Commercial Electricity Consumption (kWh/year)", min_value=0, value=_saved(sec, "Commercial", 0), key=f"{city_select}_com_energy")
+        ind_energy = st.number_input("Industrial Electricity Consumption (kWh/year)", min_value=0, value=_saved(sec, "Industrial", 0), key=f"{city_select}_ind_energy")
+        renewable_share = st.slider("Renewable Energy Share (%)", 0,100,_saved(sec, "Renewable_Share", 0), key=f"{city_select}_renewable_share")
+        ee_buildings = st.number_input("No. of Energy-Efficient Buildings Certified", min_value=0, value=_saved(sec, "EE_Buildings", 0), key=f"{city_select}_ee_buildings")
+        street_options = ["LED","CFL","Other"]
+        street_lighting_type = st.selectbox("Street Lighting Type", street_options, index=_saved_index(sec, "Street_Lighting_Type", street_options), key=f"{city_select}_street_type")
+        street_lighting_coverage = st.slider("Street Lighting Coverage (%)",0,100,_saved(sec, "Street_Lighting_Coverage", 0), key=f"{city_select}_street_coverage")
+        fuel_options = ["Coal","Gas","Biomass","Electricity","Petroleum"]
+        fuel_types = st.multiselect("Fuel Types Used", fuel_options, default=[f for f in _saved(sec, "Fuel_Types", []) if f in fuel_options], key=f"{city_select}_fuel_types")
+        public_building_energy = st.number_input("Public Building Energy Consumption (kWh/year)", min_value=0, value=_saved(sec, "Public_Building_Energy", 0), key=f"{city_select}_public_energy")
+        green_policy = st.selectbox("Green Building Policies in Place", ["Yes","No"], index=_saved_index(sec, "Green_Policy", ["Yes","No"]), key=f"{city_select}_green_policy")
+
+        # New comprehensive fields
+        energy_emission_target = st.number_input("Energy Sector Emission Reduction Target (%)", min_value=0, max_value=100, value=_saved(sec, "Emission_Target", 0), key=f"{city_select}_energy_target")
+        energy_action_plan = st.text_area("Detailed Action Plan (timeline, responsible dept.)", value=_saved(sec, "Action_Plan", ""), key=f"{city_select}_energy_action_plan")
+        energy_implementation_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", value=_saved(sec, "Implementation_Strategy", ""), key=f"{city_select}_energy_strategy")
+        energy_budget = st.number_input("Energy Sector Budget Allocation (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_energy_budget")
+        energy_mer_indicators = st.text_area("MER Indicators for Energy & Buildings", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_energy_mer")
+        upload_energy = st.file_uploader("Upload supporting documents for Energy & Buildings", type=UPLOAD_TYPES, key=f"{city_select}_upload_energy")
+
+        submitted = st.form_submit_button("Save Energy & Buildings Data")
+
+    if submitted:
+        save_cap_section(city_select, "Energy_Buildings", {
+            "Residential":res_energy,"Commercial":com_energy,"Industrial":ind_energy,"Renewable_Share":renewable_share,
+            "EE_Buildings":ee_buildings,"Street_Lighting_Type":street_lighting_type,"Street_Lighting_Coverage":street_lighting_coverage,
+            "Fuel_Types":fuel_types,"Public_Building_Energy":public_building_energy,"Green_Policy":green_policy,
+            "Emission_Target":energy_emission_target,"Action_Plan":energy_action_plan,"Implementation_Strategy":energy_implementation_strategy,
+            "Budget":energy_budget,"MER_Indicators":energy_mer_indicators,"Upload":upload_energy
+        })
+        st.success("Energy & Buildings data saved successfully!")
+
+def cap_green_biodiversity(city_select, city_info):
+    sec = city_info.get("Green_Biodiversity",{})
+    with st.form("cap_green_biodiversity_form"):
+        green_cover_area = st.number_input("Total Green Cover Area (ha)", min_value=0, value=_saved(sec, "Green_Cover", 0), key=f"{city_select}_green_cover")
+        tree_density = st.number_input("Tree Density (trees/km²)", min_value=0, value=_saved(sec, "Tree_Density", 0), key=f"{city_select}_tree_density")
+        protected_areas = st.number_input("Protected Areas (ha)", min_value=0, value=_saved(sec, "Protected_Areas", 0), key=f"{city_select}_protected_areas")
+        biodiversity_programs = st.text_area("Biodiversity Programs", value=_saved(sec, "Programs", ""), key=f"{city_select}_biodiversity_programs")
+        urban_forests = st.number_input("Urban Forests Area (ha)", min_value=0, value=_saved(sec, "Urban_Forests", 0), key=f"{city_select}_urban_forests")
+
+        # New comprehensive fields
+        green_cover_target = st.number_input("Target Increase in Green Cover (%)", min_value=0, max_value=100, value=_saved(sec, "Target", 0), key=f"{city_select}_green_target")
+        urban_forest_plan = st.text_area("Urban Forests & Biodiversity Improvement Actions", value=_saved(sec, "Urban_Forest_Plan", ""), key=f"{city_select}_urban_forest_plan")
+        green_implementation_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", value=_saved(sec, "Implementation_Strategy", ""), key=f"{city_select}_green_strategy")
+        green_budget = st.number_input("Budget Allocation for Green Cover & Biodiversity (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_green_budget")
+        green_mer_indicators = st.text_area("MER Indicators for Green Cover & Biodiversity", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_green_mer")
+        upload_green = st.file_uploader("Upload supporting documents for Green Cover & Biodiversity", type=UPLOAD_TYPES, key=f"{city_select}_upload_green")
+
+        submitted = st.form_submit_button("Save Green Cover & Biodiversity Data")
+
+    if submitted:
+        save_cap_section(city_select, "Green_Biodiversity", {
+            "Green_Cover":green_cover_area,"Tree_Density":tree_density,"Protected_Areas":protected_areas,
+            "Programs":biodiversity_programs,"Urban_Forests":urban_forests,
+            "Target":green_cover_target,"Urban_Forest_Plan":urban_forest_plan,"Implementation_Strategy":green_implementation_strategy,
+            "Budget":green_budget,"MER_Indicators":green_mer_indicators,"Upload":upload_green
+        })
+        st.success("Green Cover & Biodiversity data saved successfully!")
+
+def cap_mobility(city_select, city_info):
+    sec = city_info.get("Mobility",{})
+    with st.form("cap_mobility_form"):
+        public_transport_coverage = st.slider("Public Transport Coverage (%)",0,100,_saved(sec, "Public_Transport", 0), key=f"{city_select}_pt_coverage")
+        non_motorized_infra = st.slider("Non-Motorized Infrastructure (%)",0,100,_saved(sec, "Non_Motorized", 0), key=f"{city_select}_nmi")
+        ev_charging_stations = st.number_input("No. of EV Charging Stations", min_value=0, value=_saved(sec, "EV_Stations", 0), key=f"{city_select}_ev_stations")
+        veh_emissions = st.number_input("Average Vehicle Emissions (gCO2/km)", min_value=0, value=_saved(sec, "Vehicle_Emissions", 0), key=f"{city_select}_veh_emissions")
+        smart_transport_projects = st.text_area("Smart Transport Projects", value=_saved(sec, "Smart_Projects", ""), key=f"{city_select}_smart_projects")
+
+        # New comprehensive fields
+        transport_emission_target = st.number_input("Transport Sector Emission Reduction Target (%)", min_value=0, max_value=100, value=_saved(sec, "Emission_Target", 0), key=f"{city_select}_transport_target")
+        mobility_action_plan = st.text_area("Transport & Mobility Action Plan (timeline, responsible dept.)", value=_saved(sec, "Action_Plan", ""), key=f"{city_select}_mobility_action_plan")
+        mobility_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", value=_saved(sec, "Implementation_Strategy", ""), key=f"{city_select}_mobility_strategy")
+        mobility_budget = st.number_input("Budget Allocation for Transport & Mobility (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_mobility_budget")
+        mobility_mer_indicators = st.text_area("MER Indicators for Sustainable Mobility", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_mobility_mer")
+        upload_mobility = st.file_uploader("Upload supporting documents for Sustainable Mobility", type=UPLOAD_TYPES, key=f"{city_select}_upload_mobility")
+
+        submitted = st.form_submit_button("Save Sustainable Mobility Data")
+
+    if submitted:
+        save_cap_section(city_select, "Mobility", {
+            "Public_Transport":public_transport_coverage,"Non_Motorized":non_motorized_infra,
+            "EV_Stations":ev_charging_stations,"Vehicle_Emissions":veh_emissions,"Smart_Projects":smart_transport_projects,
+            "Emission_Target":transport_emission_target,"Action_Plan":mobility_action_plan,
+            "Implementation_Strategy":mobility_strategy,"Budget":mobility_budget,"MER_Indicators":mobility_mer_indicators,
+            "Upload":upload_mobility
+        })
+        st.success("Sustainable Mobility data saved successfully!")
+
+def cap_water(city_select, city_info):
+    sec = city_info.get("Water",{})
+    with st.form("cap_water_form"):
+        water_consumption = st.number_input("Total Water Consumption (ML/year)", min_value=0, value=_saved(sec, "Consumption", 0), key=f"{city_select}_water_cons")
+        wastewater_treatment = st.slider("Wastewater Treatment Coverage (%)",0,100,_saved(sec, "WWT", 0), key=f"{city_select}_wwt")
+        rainwater_harvesting = st.selectbox("Rainwater Harvesting Implementation", ["Yes","No"], index=_saved_index(sec, "RWH", ["Yes","No"]), key=f"{city_select}_rwh")
+        leakage_ratio = st.slider("Water Leakage Ratio (%)",0,100,_saved(sec, "Leakage", 0), key=f"{city_select}_leakage_ratio")
+        water_policy = st.text_area("Water Management Policies", value=_saved(sec, "Policy", ""), key=f"{city_select}_water_policy")
+
+        # New comprehensive fields
+        water_emission_target = st.number_input("Water Sector Emission Reduction Target (%)", min_value=0, max_value=100, value=_saved(sec, "Emission_Target", 0), key=f"{city_select}_water_target")
+        water_action_plan = st.text_area("Water Sector Action Plan (timeline, responsible dept.)", value=_saved(sec, "Action_Plan", ""), key=f"{city_select}_water_action_plan")
+        water_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", value=_saved(sec, "Implementation_Strategy", ""), key=f"{city_select}_water_strategy")
+        water_budget = st.number_input("Budget Allocation for Water Sector (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_water_budget")
+        water_mer_indicators = st.text_area("MER Indicators for Water Resources", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_water_mer")
+        upload_water = st.file_uploader("Upload supporting documents for Water Resources", type=UPLOAD_TYPES, key=f"{city_select}_upload_water")
+
+        submitted = st.form_submit_button("Save Water Resources Data")
+
+    if submitted:
+        save_cap_section(city_select, "Water", {
+            "Consumption":water_consumption,"WWT":wastewater_treatment,"RWH":rainwater_harvesting,
+            "Leakage":leakage_ratio,"Policy":water_policy,
+            "Emission_Target":water_emission_target,"Action_Plan":water_action_plan,
+            "Implementation_Strategy":water_strategy,"Budget":water_budget,"MER_Indicators":water_mer_indicators,
+            "Upload":upload_water
+        })
+        st.success("Water Resources data saved successfully!")
+
+def cap_waste(city_select, city_info):
+    sec = city_info.get("Waste",{})
+    with st.form("cap_waste_form"):
+        total_waste = st.number_input("Total Waste Generated (t/year)", min_value=0, value=_saved(sec, "Total", 0), key=f"{city_select}_total_waste")
+        waste_recycled = st.slider("Waste Recycled (%)",0,100,_saved(sec, "Recycled", 0), key=f"{city_select}_waste_recycled")
+        waste_treatment_facilities = st.number_input("No. of Treatment Facilities", min_value=0, value=_saved(sec, "Facilities", 0), key=f"{city_select}_waste_facilities")
+        composting_infra = st.selectbox("Composting Infrastructure", ["Yes","No"], index=_saved_index(sec, "Composting", ["Yes","No"]), key=f"{city_select}_composting")
+        hazardous_waste_policy = st.text_area("Hazardous Waste Policy", value=_saved(sec, "Hazardous", ""), key=f"{city_select}_hazardous_policy")
+
+        # New comprehensive fields
+        waste_emission_target = st.number_input("Waste Sector Emission Reduction Target (%)", min_value=0, max_value=100, value=_saved(sec, "Emission_Target", 0), key=f"{city_select}_waste_target")
+        waste_action_plan = st.text_area("Waste Management Action Plan (timeline, responsible dept.)", value=_saved(sec, "Action_Plan", ""), key=f"{city_select}_waste_action_plan")
+        waste_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", value=_saved(sec, "Implementation_Strategy", ""), key=f"{city_select}_waste_strategy")
+        waste_budget = st.number_input("Budget Allocation for Waste Sector (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_waste_budget")
+        waste_mer_indicators = st.text_area("MER Indicators for Waste Management", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_waste_mer")
+        upload_waste = st.file_uploader("Upload supporting documents for Waste Management", type=UPLOAD_TYPES, key=f"{city_select}_upload_waste")
+
+        submitted = st.form_submit_button("Save Waste Management Data")
+
+    if submitted:
+        save_cap_section(city_select, "Waste", {
+            "Total":total_waste,"Recycled":waste_recycled,"Facilities":waste_treatment_facilities,
+            "Composting":composting_infra,"Hazardous":hazardous_waste_policy,
+            "Emission_Target":waste_emission_target,"Action_Plan":waste_action_plan,
+            "Implementation_Strategy":waste_strategy,"Budget":waste_budget,"MER_Indicators":waste_mer_indicators,
+            "Upload":upload_waste
+        })
+        st.success("Waste Management data saved successfully!")
+
+def rcp_editor(saved_rcp, key):
+    """
+    One data-editor grid for the 2020-2050 RCP series (instead of 31 number inputs).
+    Returns the series as a list of 31 floats.
+    """
+    import pandas as pd
+    if not (isinstance(saved_rcp, list) and len(saved_rcp) == len(RCP_YEARS)):
+        saved_rcp = [0.0] * len(RCP_YEARS)
+    df = pd.DataFrame({"Year": RCP_YEARS, RCP_COLUMN: [float(v) for v in saved_rcp]})
+    edited = st.data_editor(
+        df, key=key, hide_index=True, num_rows="fixed", disabled=["Year"], use_container_width=True,
+        column_config={
+            "Year": st.column_config.NumberColumn("Year", format="%d"),
+            RCP_COLUMN: st.column_config.NumberColumn(RCP_COLUMN, min_value=-10.0, max_value=10.0, step=0.1, format="%.2f"),
+        },
+    )
+    return edited[RCP_COLUMN].fillna(0.0).astype(float).clip(-10.0, 10.0).tolist()
+
+def cap_climate_data(city_select, city_info):
+    sec = city_info.get("Climate_Data",{})
+    with st.form("cap_climate_data_form"):
+        avg_temp = st.number_input("Average Temperature (°C)", value=_saved(sec, "Avg_Temp", 0.0), key=f"{city_select}_avg_temp")
+        rainfall = st.number_input("Annual Rainfall (mm)", value=_saved(sec, "Rainfall", 0.0), key=f"{city_select}_rainfall")
+        extreme_events = st.text_area("Extreme Events History", value=_saved(sec, "Extreme_Events", ""), key=f"{city_select}_extreme_events")
+        st.markdown("**RCP Temperature Change by Year (°C)**")
+        rcp_scenario = rcp_editor(sec.get("RCP"), key=f"{city_select}_rcp_series")
+
+        # New comprehensive fields
+        sectoral_vulnerability = st.text_area("Sectoral Vulnerability & Risk Assessment", value=_saved(sec, "Vulnerability", ""), key=f"{city_select}_sectoral_risk")
+        adaptation_plan = st.text_area("Adaptation & Resilience Action Plan", value=_saved(sec, "Adaptation", ""), key=f"{city_select}_adaptation_plan")
+        climate_finance_allocation = st.number_input("Climate Budget Allocation (₹ Crores)", min_value=0, value=_saved(sec, "Budget", 0), key=f"{city_select}_climate_budget")
+        climate_mer_indicators = st.text_area("MER Indicators for Climate Adaptation", value=_saved(sec, "MER_Indicators", ""), key=f"{city_select}_climate_mer")
+        upload_climate = st.file_uploader("Upload supporting documents for Climate Data", type=UPLOAD_TYPES, key=f"{city_select}_upload_climate")
+
+        submitted = st.form_submit_button("Save Climate Data")
+
+    if submitted:
+        save_cap_section(city_select, "Climate_Data", {
+            "Avg_Temp":avg_temp,"Rainfall":rainfall,"Extreme_Events":extreme_events,"RCP":rcp_scenario,
+            "Vulnerability":sectoral_vulnerability,"Adaptation":adaptation_plan,
+            "Budget":climate_finance_allocation,"MER_Indicators":climate_mer_indicators,"Upload":upload_climate
+        })
+        st.success("Climate Data saved successfully!")
+
+CAP_SECTIONS = {
+    "1. Basic Info": cap_basic_info,
+    "2. Energy & Buildings": cap_energy_buildings,
+    "3. Green Cover & Biodiversity": cap_green_biodiversity,
+    "4. Sustainable Mobility": cap_mobility,
+    "5. Water Resources": cap_water,
+    "6. Waste Management": cap_waste,
+    "7. Climate Data": cap_climate_data,
+}
+
 # -------------------- Admin Panel --------------------
 def admin_panel():
     ADMIN_PASSWORD = "123"
@@ -356,8 +667,12 @@ def admin_panel():
         st.session_state.current_admin_tab = 0
     if 'last_selected_city' not in st.session_state:
         st.session_state.last_selected_city = "Maharashtra"
-    if 'city_data' not in st.session_state:
-        st.session_state.city_data = {}
+
+    # import the Drive/PDF/Excel stacks in the background while the admin logs in (once per process)
+    import admin_warmup
+    admin_warmup.start()
+    # no local snapshot on a fresh server: seed the store from the copy on Drive (once per process)
+    city_snapshot.start_drive_seed(parent_folder_id())
 
     if not st.session_state.admin_logged_in:
         st.header("Admin Login")
@@ -372,7 +687,10 @@ def admin_panel():
         return
 
     st.header("Admin Panel")
-    admin_tabs = st.tabs(["Add/Update City","Generate CAP","GHG Inventory","Logout"])
+    # warm the state cache for all cities in the background (once per server process)
+    from state_drive import start_prefetch
+    start_prefetch(parent_folder_id())
+    admin_tabs = st.tabs(["Add/Update City","Generate CAP","GHG Inventory","Publish All","Logout"])
 
     # --- Add/Update City ---
     with admin_tabs[0]:
@@ -389,56 +707,62 @@ def admin_panel():
                 key="add_update_city"
             )
             st.session_state.last_selected_city = city_select
-            city_info = st.session_state.city_data.get(city_select, {})
 
-            
-            district = st.text_input("District", value=city_info.get("District",""), key="district")
-            year_est = st.number_input("Year of Establishment", min_value=1500, max_value=2050,
-                                       value=city_info.get("Year_Establishment",2025), key="year_est")
-            admin_types = ["State","Municipal Corporation","Municipal Council","Other"]
-            type_admin = st.selectbox("Type of Administration", admin_types,
-                                      index=admin_types.index(city_info.get("Type_Admin","State")), key="type_admin")
-            cap_status_options = ["Not Started","In Progress","Completed"]
-            cap_status = st.selectbox("CAP Status", cap_status_options,
-                                      index=cap_status_options.index(city_info.get("CAP_Status","Not Started")), key="cap_status")
-            cap_link = city_info.get("CAP_Link","")
-            if cap_status == "Completed":
-                cap_link = st.text_input("CAP Link", value=cap_link, key="cap_link")
-
-            col1, col2, col3 = st.columns(3)
+            load_city_from_drive(city_select)
+            city_info = city_store.get_city(city_select)
+            saved_pop = city_info.get("Population",{})
+            col1, col2 = st.columns(2)
             with col1:
-                male_pop = st.number_input("Male", min_value=0,
-                                           value=city_info.get("Population",{}).get("Male",0), key="pop_male")
+                st.metric("Total Population", saved_pop.get("Total",0))
             with col2:
-                female_pop = st.number_input("Female", min_value=0,
-                                             value=city_info.get("Population",{}).get("Female",0), key="pop_female")
-            total_pop = male_pop + female_pop
-            with col3:
-                st.metric("Total Population", total_pop)
+                st.metric("Density (people/km²)", round(city_info.get("Density",0),2))
+
+            # Inputs are batched in a form: editing a field does not rerun the app,
+            # only "Add/Update City" does (one rerun, one write). Keys are per city (see CAP sections).
+            with st.form("add_update_city_form"):
+                district = st.text_input("District", value=city_info.get("District",""), key=f"{city_select}_district")
+                year_est = st.number_input("Year of Establishment", min_value=1500, max_value=2050,
+                                           value=city_info.get("Year_Establishment",2025), key=f"{city_select}_year_est")
+                admin_types = ["State","Municipal Corporation","Municipal Council","Other"]
+                type_admin = st.selectbox("Type of Administration", admin_types,
+                                          index=admin_types.index(city_info.get("Type_Admin","State")), key=f"{city_select}_type_admin")
+                cap_status_options = ["Not Started","In Progress","Completed"]
+                cap_status = st.selectbox("CAP Status", cap_status_options,
+                                          index=cap_status_options.index(city_info.get("CAP_Status","Not Started")), key=f"{city_select}_cap_status")
+                cap_link = st.text_input("CAP Link (saved when CAP Status is Completed)",
+                                         value=city_info.get("CAP_Link",""), key=f"{city_select}_cap_link")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    male_pop = st.number_input("Male", min_value=0,
+                                               value=saved_pop.get("Male",0), key=f"{city_select}_pop_male")
+                with col2:
+                    female_pop = st.number_input("Female", min_value=0,
+                                                 value=saved_pop.get("Female",0), key=f"{city_select}_pop_female")
 
-            col1, col2 = st.columns(2)
-            with col1:
                 area = st.number_input("Area (sq km)", min_value=0,
-                                       value=city_info.get("Area",0), key="area")
-            with col2:
+                                       value=city_info.get("Area",0), key=f"{city_select}_area")
+                sex_ratio = st.number_input("Sex Ratio (F/M)", min_value=0,
+                                            value=city_info.get("Sex_Ratio",0), key=f"{city_select}_sex_ratio")
+                env_exist = st.selectbox("Environment Dept Exist", ["Yes","No"],
+                                         index=0 if city_info.get("Env_Dept_Exist","Yes")=="Yes" else 1, key=f"{city_select}_env_exist")
+                dept_name = st.text_input("Department Name (saved when no Environment Dept exists)",
+                                          value=city_info.get("Dept_Name",""), key=f"{city_select}_dept_name")
+                dept_person = st.text_input("Department Contact Person", value=city_info.get("Dept_Person",""), key=f"{city_select}_dept_person")
+                dept_email = st.text_input("Department Email ID", value=city_info.get("Dept_Email",""), key=f"{city_select}_dept_email")
+                website = st.text_input("Website", value=city_info.get("Website",""), key=f"{city_select}_website")
+
+                # --- Save Button ---
+                submitted = st.form_submit_button("Add/Update City")
+
+            if submitted:
+                total_pop = male_pop + female_pop
                 density = total_pop / area if area > 0 else 0
-                st.metric("Density (people/km²)", round(density,2))
-
-            sex_ratio = st.number_input("Sex Ratio (F/M)", min_value=0,
-                                        value=city_info.get("Sex_Ratio",0), key="sex_ratio")
-            env_exist = st.selectbox("Environment Dept Exist", ["Yes","No"],
-                                     index=0 if city_info.get("Env_Dept_Exist","Yes")=="Yes" else 1, key="env_exist")
-            dept_name = ""
-            if env_exist == "No":
-                dept_name = st.text_input("Department Name", value=city_info.get("Dept_Name",""), key="dept_name")
-            dept_person = st.text_input("Department Contact Person", value=city_info.get("Dept_Person",""), key="dept_person")
-            dept_email = st.text_input("Department Email ID", value=city_info.get("Dept_Email",""), key="dept_email")
-            website = st.text_input("Website", value=city_info.get("Website",""), key="website")
-
-            # --- Save Button ---
-            if st.button("Add/Update City"):
-                prev_data = st.session_state.city_data.get(city_select, {})
-                st.session_state.city_data[city_select] = {
+                # merge into the stored record so CAP sections saved earlier are kept, and save
+                # it with the GHG sectors that fall back to this population (one store write)
+                import emissions_engine
+                record = city_store.get_city(city_select)
+                record.update({
                     "District": district,
                     "Year_Establishment": year_est,
                     "Type_Admin": type_admin,
@@ -453,236 +777,22 @@ def admin_panel():
                     "Dept_Person": dept_person,
                     "Dept_Email": dept_email,
                     "Website": website
-                }
+                })
+                city_store.save_city(city_select, emissions_engine.with_ghg(record, sections=["Population"]))
                 st.success(f"{city_select} data saved successfully!")
 
-            #Loading previous state when city selected
-            from state_drive import load_state_json_from_folder
-            from drive_upload import get_or_create_folder
-
-            # Try Streamlit secrets first (Streamlit Cloud), fallback to environment variable or None
-            parent_id = None
-            try:
-                PARENT_FOLDER_ID = st.secrets.get("PARENT_FOLDER_ID", None)
-            except Exception:
-                PARENT_FOLDER_ID = os.environ.get("PARENT_FOLDER_ID", None)
-
-            
-            # After city_select is chosen:
-            folder_id = get_or_create_folder(city_select, parent_id=PARENT_FOLDER_ID)
-            try:
-                saved = load_state_json_from_folder(folder_id)
-                if saved:
-                    # saved should be dict of city_data keys; merge into session_state safely
-                    for k, v in saved.items():
-                        # avoid overwriting in-progress edits - set defaults only if missing
-                        if k not in st.session_state or not st.session_state.get(k):
-                            st.session_state[k] = v
-                    st.info("Loaded saved state for city from Google Drive.")
-            except Exception as e:
-                # ignore errors, allow app to continue
-                st.warning(f"Could not load saved state for {city_select}: {e}")
-
 
     # --- Generate CAP  ---
     with admin_tabs[1]:
         st.subheader("Generate CAP")
         city_select = st.selectbox("Select City for CAP", cities, key="cap_city_select")
-        city_info = st.session_state.city_data.get(city_select, {})
-
-        cap_tabs = st.tabs([
-            "1. Basic Info","2. Energy & Buildings","3. Green Cover & Biodiversity",
-            "4. Sustainable Mobility","5. Water Resources","6. Waste Management","7. Climate Data"
-        ])
-
-        # -------------------- 1. Basic Info --------------------
-    with cap_tabs[0]:
-        population = st.number_input("Population", min_value=0, value=city_info.get("Basic Info",{}).get("Population",0), key="cap_pop")
-        area = st.number_input("Area (sq km)", min_value=0, value=city_info.get("Basic Info",{}).get("Area",0), key="cap_area")
-        gdp = st.number_input("GDP (₹ Crores)", min_value=0, value=city_info.get("Basic Info",{}).get("GDP",0), key="cap_gdp")
-        density = st.number_input("Population Density (people/km²)", min_value=0, key="cap_density")
-        climate_zone = st.text_input("Climate Zone", value=city_info.get("Basic Info",{}).get("Climate_Zone",""), key="cap_climate_zone")
-        admin_structure = st.text_input("Administrative Structure", value=city_info.get("Basic Info",{}).get("Admin",""), key="cap_admin_structure")
-        cap_status_options = ["Not Started","In Progress","Completed"]
-        cap_status_form_default = city_info.get("CAP_Status","Not Started")
-        if cap_status_form_default not in cap_status_options:
-            cap_status_form_default = "Not Started"
-        cap_status_form = st.selectbox("CAP Status", cap_status_options, index=cap_status_options.index(cap_status_form_default), key="cap_status_form")
-        last_updated_input = st.date_input("Last Updated", datetime.date.today(), key="cap_last_updated")
-
-        # New comprehensive fields
-        population_5yr = st.number_input("Projected Population in 5 years", min_value=0, key="pop_5yr")
-        cap_targets = st.text_area("Overall CAP Goals / Targets (aligned with SDGs/NDCs)", key="cap_targets")
-        cap_mer_indicators = st.text_area("Overall MER Indicators for CAP", key="cap_mer")
-        basic_budget_allocation = st.number_input("Budget Allocation for CAP Implementation (₹ Crores)", min_value=0, key="cap_budget")
-        upload_basic = st.file_uploader("Upload any supporting documents for Basic Info", type=["pdf","xlsx","docx"], key="upload_basic")
-
-        if st.button("Save Basic Info Data"):
-            if city_select not in st.session_state.city_data:
-                st.session_state.city_data[city_select] = {}
-            st.session_state.city_data[city_select]["Basic Info"] = {
-                "Population":population,"Area":area,"GDP":gdp,"Density":density,"Climate_Zone":climate_zone,
-                "Admin":admin_structure,"CAP_Status":cap_status_form,"Last_Updated":last_updated_input.strftime("%B %Y"),
-                "Population_5yr":population_5yr,"CAP_Targets":cap_targets,"MER_Indicators":cap_mer_indicators,
-                "Budget":basic_budget_allocation,"Upload":upload_basic
-            }
-            st.success("Basic Info saved successfully!")
-
-    # -------------------- 2. Energy & Buildings --------------------
-    with cap_tabs[1]:
-        res_energy = st.number_input("Residential Electricity Consumption (kWh/year)", min_value=0, key="res_energy")
-        com_energy = st.number_input("Commercial Electricity Consumption (kWh/year)", min_value=0, key="com_energy")
-        ind_energy = st.number_input("Industrial Electricity Consumption (kWh/year)", min_value=0, key="ind_energy")
-        renewable_share = st.slider("Renewable Energy Share (%)", 0,100,0, key="renewable_share")
-        ee_buildings = st.number_input("No. of Energy-Efficient Buildings Certified", min_value=0, key="ee_buildings")
-        street_lighting_type = st.selectbox("Street Lighting Type", ["LED","CFL","Other"], key="street_type")
-        street_lighting_coverage = st.slider("Street Lighting Coverage (%)",0,100,0, key="street_coverage")
-        fuel_types = st.multiselect("Fuel Types Used", ["Coal","Gas","Biomass","Electricity","Petroleum"], key="fuel_types")
-        public_building_energy = st.number_input("Public Building Energy Consumption (kWh/year)", min_value=0, key="public_energy")
-        green_policy = st.selectbox("Green Building Policies in Place", ["Yes","No"], key="green_policy")
+        load_city_from_drive(city_select)
+        city_info = city_store.get_city(city_select)
 
-        # New comprehensive fields
-        energy_emission_target = st.number_input("Energy Sector Emission Reduction Target (%)", min_value=0, max_value=100, key="energy_target")
-        energy_action_plan = st.text_area("Detailed Action Plan (timeline, responsible dept.)", key="energy_action_plan")
-        energy_implementation_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", key="energy_strategy")
-        energy_budget = st.number_input("Energy Sector Budget Allocation (₹ Crores)", min_value=0, key="energy_budget")
-        energy_mer_indicators = st.text_area("MER Indicators for Energy & Buildings", key="energy_mer")
-        upload_energy = st.file_uploader("Upload supporting documents for Energy & Buildings", type=["pdf","xlsx","docx"], key="upload_energy")
-
-        if st.button("Save Energy & Buildings Data"):
-            st.session_state.city_data[city_select]["Energy_Buildings"] = {
-                "Residential":res_energy,"Commercial":com_energy,"Industrial":ind_energy,"Renewable_Share":renewable_share,
-                "EE_Buildings":ee_buildings,"Street_Lighting_Type":street_lighting_type,"Street_Lighting_Coverage":street_lighting_coverage,
-                "Fuel_Types":fuel_types,"Public_Building_Energy":public_building_energy,"Green_Policy":green_policy,
-                "Emission_Target":energy_emission_target,"Action_Plan":energy_action_plan,"Implementation_Strategy":energy_implementation_strategy,
-                "Budget":energy_budget,"MER_Indicators":energy_mer_indicators,"Upload":upload_energy
-            }
-            st.success("Energy & Buildings data saved successfully!")
-
-    # -------------------- 3. Green Cover & Biodiversity --------------------
-    with cap_tabs[2]:
-        green_cover_area = st.number_input("Total Green Cover Area (ha)", min_value=0, key="green_cover")
-        tree_density = st.number_input("Tree Density (trees/km²)", min_value=0, key="tree_density")
-        protected_areas = st.number_input("Protected Areas (ha)", min_value=0, key="protected_areas")
-        biodiversity_programs = st.text_area("Biodiversity Programs", key="biodiversity_programs")
-        urban_forests = st.number_input("Urban Forests Area (ha)", min_value=0, key="urban_forests")
-
-        # New comprehensive fields
-        green_cover_target = st.number_input("Target Increase in Green Cover (%)", min_value=0, max_value=100, key="green_target")
-        urban_forest_plan = st.text_area("Urban Forests & Biodiversity Improvement Actions", key="urban_forest_plan")
-        green_implementation_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", key="green_strategy")
-        green_budget = st.number_input("Budget Allocation for Green Cover & Biodiversity (₹ Crores)", min_value=0, key="green_budget")
-        green_mer_indicators = st.text_area("MER Indicators for Green Cover & Biodiversity", key="green_mer")
-        upload_green = st.file_uploader("Upload supporting documents for Green Cover & Biodiversity", type=["pdf","xlsx","docx"], key="upload_green")
-
-        if st.button("Save Green Cover & Biodiversity Data"):
-            st.session_state.city_data[city_select]["Green_Biodiversity"] = {
-                "Green_Cover":green_cover_area,"Tree_Density":tree_density,"Protected_Areas":protected_areas,
-                "Programs":biodiversity_programs,"Urban_Forests":urban_forests,
-                "Target":green_cover_target,"Urban_Forest_Plan":urban_forest_plan,"Implementation_Strategy":green_implementation_strategy,
-                "Budget":green_budget,"MER_Indicators":green_mer_indicators,"Upload":upload_green
-            }
-            st.success("Green Cover & Biodiversity data saved successfully!")
-
-    # -------------------- 4. Sustainable Mobility --------------------
-    with cap_tabs[3]:
-        public_transport_coverage = st.slider("Public Transport Coverage (%)",0,100,0, key="pt_coverage")
-        non_motorized_infra = st.slider("Non-Motorized Infrastructure (%)",0,100,0, key="nmi")
-        ev_charging_stations = st.number_input("No. of EV Charging Stations", min_value=0, key="ev_stations")
-        veh_emissions = st.number_input("Average Vehicle Emissions (gCO2/km)", min_value=0, key="veh_emissions")
-        smart_transport_projects = st.text_area("Smart Transport Projects", key="smart_projects")
-
-        # New comprehensive fields
-        transport_emission_target = st.number_input("Transport Sector Emission Reduction Target (%)", min_value=0, max_value=100, key="transport_target")
-        mobility_action_plan = st.text_area("Transport & Mobility Action Plan (timeline, responsible dept.)", key="mobility_action_plan")
-        mobility_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", key="mobility_strategy")
-        mobility_budget = st.number_input("Budget Allocation for Transport & Mobility (₹ Crores)", min_value=0, key="mobility_budget")
-        mobility_mer_indicators = st.text_area("MER Indicators for Sustainable Mobility", key="mobility_mer")
-        upload_mobility = st.file_uploader("Upload supporting documents for Sustainable Mobility", type=["pdf","xlsx","docx"], key="upload_mobility")
-
-        if st.button("Save Sustainable Mobility Data"):
-            st.session_state.city_data[city_select]["Mobility"] = {
-                "Public_Transport":public_transport_coverage,"Non_Motorized":non_motorized_infra,
-                "EV_Stations":ev_charging_stations,"Vehicle_Emissions":veh_emissions,"Smart_Projects":smart_transport_projects,
-                "Emission_Target":transport_emission_target,"Action_Plan":mobility_action_plan,
-                "Implementation_Strategy":mobility_strategy,"Budget":mobility_budget,"MER_Indicators":mobility_mer_indicators,
-                "Upload":upload_mobility
-            }
-            st.success("Sustainable Mobility data saved successfully!")
-
-    # -------------------- 5. Water Resources --------------------
-    with cap_tabs[4]:
-        water_consumption = st.number_input("Total Water Consumption (ML/year)", min_value=0, key="water_cons")
-        wastewater_treatment = st.slider("Wastewater Treatment Coverage (%)",0,100,0, key="wwt")
-        rainwater_harvesting = st.selectbox("Rainwater Harvesting Implementation", ["Yes","No"], key="rwh")
-        leakage_ratio = st.slider("Water Leakage Ratio (%)",0,100,0, key="leakage_ratio")
-        water_policy = st.text_area("Water Management Policies", key="water_policy")
-
-        # New comprehensive fields
-        water_emission_target = st.number_input("Water Sector Emission Reduction Target (%)", min_value=0, max_value=100, key="water_target")
-        water_action_plan = st.text_area("Water Sector Action Plan (timeline, responsible dept.)", key="water_action_plan")
-        water_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", key="water_strategy")
-        water_budget = st.number_input("Budget Allocation for Water Sector (₹ Crores)", min_value=0, key="water_budget")
-        water_mer_indicators = st.text_area("MER Indicators for Water Resources", key="water_mer")
-        upload_water = st.file_uploader("Upload supporting documents for Water Resources", type=["pdf","xlsx","docx"], key="upload_water")
-
-        if st.button("Save Water Resources Data"):
-            st.session_state.city_data[city_select]["Water"] = {
-                "Consumption":water_consumption,"WWT":wastewater_treatment,"RWH":rainwater_harvesting,
-                "Leakage":leakage_ratio,"Policy":water_policy,
-                "Emission_Target":water_emission_target,"Action_Plan":water_action_plan,
-                "Implementation_Strategy":water_strategy,"Budget":water_budget,"MER_Indicators":water_mer_indicators,
-                "Upload":upload_water
-            }
-            st.success("Water Resources data saved successfully!")
-
-    # -------------------- 6. Waste Management --------------------
-    with cap_tabs[5]:
-        total_waste = st.number_input("Total Waste Generated (t/year)", min_value=0, key="total_waste")
-        waste_recycled = st.slider("Waste Recycled (%)",0,100,0, key="waste_recycled")
-        waste_treatment_facilities = st.number_input("No. of Treatment Facilities", min_value=0, key="waste_facilities")
-        composting_infra = st.selectbox("Composting Infrastructure", ["Yes","No"], key="composting")
-        hazardous_waste_policy = st.text_area("Hazardous Waste Policy", key="hazardous_policy")
-
-        # New comprehensive fields
-        waste_emission_target = st.number_input("Waste Sector Emission Reduction Target (%)", min_value=0, max_value=100, key="waste_target")
-        waste_action_plan = st.text_area("Waste Management Action Plan (timeline, responsible dept.)", key="waste_action_plan")
-        waste_strategy = st.text_area("Implementation Strategy (short/mid/long-term)", key="waste_strategy")
-        waste_budget = st.number_input("Budget Allocation for Waste Sector (₹ Crores)", min_value=0, key="waste_budget")
-        waste_mer_indicators = st.text_area("MER Indicators for Waste Management", key="waste_mer")
-        upload_waste = st.file_uploader("Upload supporting documents for Waste Management", type=["pdf","xlsx","docx"], key="upload_waste")
-
-        if st.button("Save Waste Management Data"):
-            st.session_state.city_data[city_select]["Waste"] = {
-                "Total":total_waste,"Recycled":waste_recycled,"Facilities":waste_treatment_facilities,
-                "Composting":composting_infra,"Hazardous":hazardous_waste_policy,
-                "Emission_Target":waste_emission_target,"Action_Plan":waste_action_plan,
-                "Implementation_Strategy":waste_strategy,"Budget":waste_budget,"MER_Indicators":waste_mer_indicators,
-                "Upload":upload_waste
-            }
-            st.success("Waste Management data saved successfully!")
-
-    # -------------------- 7. Climate Data --------------------
-    with cap_tabs[6]:
-        avg_temp = st.number_input("Average Temperature (°C)", key="avg_temp")
-        rainfall = st.number_input("Annual Rainfall (mm)", key="rainfall")
-        extreme_events = st.text_area("Extreme Events History", key="extreme_events")
-        rcp_scenario = [st.number_input(f"RCP Year {year}", min_value=-10.0, max_value=10.0, value=0.0, key=f"rcp_{year}") for year in range(2020,2051)]
-
-        # New comprehensive fields
-        sectoral_vulnerability = st.text_area("Sectoral Vulnerability & Risk Assessment", key="sectoral_risk")
-        adaptation_plan = st.text_area("Adaptation & Resilience Action Plan", key="adaptation_plan")
-        climate_finance_allocation = st.number_input("Climate Budget Allocation (₹ Crores)", min_value=0, key="climate_budget")
-        climate_mer_indicators = st.text_area("MER Indicators for Climate Adaptation", key="climate_mer")
-        upload_climate = st.file_uploader("Upload supporting documents for Climate Data", type=["pdf","xlsx","docx"], key="upload_climate")
-
-        if st.button("Save Climate Data"):
-            st.session_state.city_data[city_select]["Climate_Data"] = {
-                "Avg_Temp":avg_temp,"Rainfall":rainfall,"Extreme_Events":extreme_events,"RCP":rcp_scenario,
-                "Vulnerability":sectoral_vulnerability,"Adaptation":adaptation_plan,
-                "Budget":climate_finance_allocation,"MER_Indicators":climate_mer_indicators,"Upload":upload_climate
-            }
-            st.success("Climate Data saved successfully!")
+        # only the active section is rendered; the others build no widgets on this rerun
+        cap_section = st.radio("CAP Section", list(CAP_SECTIONS), horizontal=True, key="cap_section")
+        CAP_SECTIONS[cap_section](city_select, city_info)
+        st.markdown("---")
 
         # Final Submit Button -> redirect to GHG Inventory page
         #if st.button("Submit All CAP Data"):
@@ -690,76 +800,155 @@ def admin_panel():
           #  st.experimental_set_query_params(page="ghg_inventory")
 
        #Sudeep----------Generating GHG Files and Uploading it to Google Drive---------------
-        from export_city_files import generate_ghg_excel, generate_ghg_pdf
-        from drive_upload import get_or_create_folder, upload_file_to_folder
-        from state_drive import save_state_json_to_folder
-
-        # assume city_name and city_data are defined and populated from form
-        PARENT_FOLDER_ID = None
-        try:
-            PARENT_FOLDER_ID = st.secrets.get("PARENT_FOLDER_ID")
-        except Exception:
-            PARENT_FOLDER_ID = os.environ.get("PARENT_FOLDER_ID")
-        
+        from export_city_files import generate_city_artifacts
+        from drive_upload import get_or_create_folder
+        from upload_pipeline import upload_city_artifacts
+        from json_utils import to_jsonable
+
         if st.button("Submit All CAP Data"):
             st.success("All CAP data submitted successfully! Generating GHG files and uploading to Google Drive...") #Sudeep
-            st.experimental_set_query_params(page="ghg_inventory")
+            st.query_params["page"] = "ghg_inventory"
             
             city_name = city_select  # Use the selected city name
-            city_data = st.session_state.city_data[city_name]
+            city_data = city_store.get_city(city_name)
         
-            # 1. Generate files
-            xlsx_file = generate_ghg_excel(city_name, city_data)
-            pdf_file = generate_ghg_pdf(city_name, city_data)
+            # 1. Generate files in memory
+            artifacts = generate_city_artifacts(city_name, city_data)
+            st.session_state.cap_artifacts = {"city": city_name, "files": artifacts}
         
             # 2. Google Drive: create/get folder
-            folder_id = get_or_create_folder(city_name)
+            folder_id = get_or_create_folder(city_name, parent_id=parent_folder_id())
 
-            # 3) save application state to Drive for this city (state.json)
-            try:
-                save_state_json_to_folder(folder_id, city_data)
-            except Exception as e:
-                st.warning(f"Could not save state.json to Drive: {e}")
+            # 3) save state.json and upload generated files concurrently (retried on 429/5xx)
+            with st.spinner("Uploading to Google Drive..."):
+                synced = st.session_state.setdefault("synced_state", {})
+                result = upload_city_artifacts(folder_id, state=city_data, blobs=artifacts,
+                                               state_base=synced.get(city_name))
 
-            # 4) upload generated files
-            try:
-                uploaded_pdf = upload_file_to_folder(pdf_path, folder_id, make_public=False)
-                uploaded_xlsx = upload_file_to_folder(xlsx_path, folder_id, make_public=False)
-                st.success("Files uploaded to Google Drive.")
+            state_result = result.get("state.json")
+            if state_result.ok:
+                synced[city_name] = to_jsonable(city_data)
+            else:
+                st.warning(f"Could not save state.json to Drive: {state_result.error}")
+
+            uploaded = [result.get(a[0]) for a in artifacts]
+            if all(r.ok for r in uploaded):
+                skipped = sum(1 for r in uploaded if r.value.get("action") == "skipped")
+                st.success(f"Files synced to Google Drive in {result.seconds:.1f}s ({skipped} unchanged, not re-uploaded).")
                 st.write("Open folder:", f"https://drive.google.com/drive/folders/{folder_id}")
                 # show webViewLink if available
-                if uploaded_pdf.get("webViewLink"):
-                    st.write("PDF link:", uploaded_pdf.get("webViewLink"))
-                if uploaded_xlsx.get("webViewLink"):
-                    st.write("Excel link:", uploaded_xlsx.get("webViewLink"))
-            except Exception as e:
-                st.error(f"Upload failed: {e}")
-
-            # 5) cleanup local temp files (optional)
-            try:
-                os.remove(pdf_path)
-                os.remove(xlsx_path)
-            except Exception:
-                pass
-            
-            # 3. Upload files
-            #xlsx_drive_id = upload_file_to_folder(xlsx_file, folder_id)
-            #pdf_drive_id = upload_file_to_folder(pdf_file, folder_id)
-            #st.success(f"Files uploaded to Google Drive folder: {city_name}")
-        
+                for r in uploaded:
+                    if r.value.get("webViewLink"):
+                        st.write(f"{r.name}:", r.value.get("webViewLink"))
+            else:
+                errors = "; ".join(f"{r.name}: {r.error}" for r in uploaded if not r.ok)
+                st.error(f"Upload failed: {errors}")
+
+        # Download the last generated files (kept in memory, no temp files)
+        generated = st.session_state.get("cap_artifacts")
+        if generated and generated["city"] == city_select:
+            for filename, data, mimetype, _ in generated["files"]:
+                st.download_button(f"Download {filename}", data=data, file_name=filename, mime=mimetype,
+                                   key=f"download_{filename}")
                
     # --- GHG Inventory ---
     with admin_tabs[2]:
         st.subheader("GHG Inventory")
-        sector = st.selectbox("Select Sector", ["Energy","Transport","Waste","Water","Buildings","Industry"], key="ghg_sector")
-        ghg_values = [st.session_state.city_data.get(c, {}).get("GHG", {}).get(sector,np.random.randint(1000,10000)) for c in cities]
-        df = pd.DataFrame({"City":cities, "tCO2e":ghg_values})
+        import plotly.express as px
+        import city_table
+        import figure_cache
+        import ghg_inventory
+        import emissions_engine
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            factors_version = st.selectbox("Emission Factor Version", sorted(emissions_engine.EMISSION_FACTORS, reverse=True),
+                                           index=sorted(emissions_engine.EMISSION_FACTORS, reverse=True).index(emissions_engine.FACTORS_VERSION),
+                                           key="ghg_factors_version")
+        with col2:
+            if st.button("Recalculate All Cities"):
+                updated = emissions_engine.recalculate_all(factors_version)
+                st.success(f"GHG recalculated; {updated} cities changed.")
+        sector = st.selectbox("Select Sector", city_table.GHG_SECTORS, key="ghg_sector")
+        year = st.selectbox("Inventory Year", ghg_inventory.years() or [datetime.date.today().year], key="ghg_year")
+        # cached per inventory version: identical on every rerun until GHG data is saved
+        df = ghg_inventory.sector_view(sector, year)
         st.dataframe(df)
-        fig = px.bar(df, x="City", y="tCO2e", title=f"{sector} GHG Inventory by City")
+        fig = figure_cache.get_figure(f"inventory_{sector}_{year}", None, ghg_inventory.inventory_version(),
+                                      lambda: px.bar(df.fillna(0), x="City", y="tCO2e", title=f"{sector} GHG Inventory by City ({year})"))
         st.plotly_chart(fig, use_container_width=True)
 
-    # --- Logout ---
+    # --- Publish All Cities ---
     with admin_tabs[3]:
+        st.subheader("Publish All Cities")
+        st.caption("Generate GHG Excel/PDF files, CAP reports and CAP data workbooks for every city with saved data and upload them to Google Drive.")
+        resume_run = st.text_input("Resume run ID (optional)", key="publish_resume_run")
+        # The run is a separate `publish_all.py --source store` process: the rerun returns at once
+        # and the tab polls the checkpoint the run writes after every city.
+        if st.button("Publish All Cities"):
+            import publish_all
+            st.session_state.publish_run = publish_all.start_background_run(
+                parent_id=parent_folder_id(), run_id=resume_run.strip() or None, save_state=True)
+
+        run_id = st.session_state.get("publish_run")
+        if run_id:
+            import publish_all
+            run = publish_all.load_run(run_id)
+            exit_code = publish_all.background_exit_code(run_id)
+            if run is None or not run.get("finished"):
+                if exit_code is not None:
+                    st.error(f"Run {run_id} stopped (exit code {exit_code}). Resume it with this ID.")
+                    with open(publish_all.run_log(run_id), "r", encoding="utf-8", errors="replace") as f:
+                        st.code(f.read()[-3000:])
+                elif run is None:
+                    st.info(f"Run {run_id} is starting...")
+                else:
+                    total, processed = run.get("total", 0), run.get("processed", 0)
+                    st.progress(processed / total if total else 0.0)
+                    st.write(f"Run {run_id}: {processed}/{total} cities processed")
+                st.button("Refresh status", key="publish_refresh")
+            if run:
+                import pandas as pd
+                report = pd.DataFrame([{"City": c, "Status": e.get("status"), "Error": e.get("error", "")}
+                                       for c, e in run["cities"].items()])
+                if run.get("finished"):
+                    failed = int((report["Status"] == "failed").sum()) if len(report) else 0
+                    if failed:
+                        st.warning(f"Run {run_id} finished with {failed} failed cities. Re-run with this ID to retry them.")
+                    else:
+                        st.success(f"Run {run_id} finished.")
+                st.dataframe(report)
+
+        st.markdown("---")
+        st.caption("Statewide workbook: every CAP section as a sheet with one row per city.")
+        if st.button("Build Statewide Excel Workbook"):
+            import excel_export
+            records = city_store.all_cities()
+            names = list(cities) + [c for c in records if c not in cities]
+            with st.spinner("Writing workbook..."):
+                st.session_state.state_workbook = (excel_export.state_workbook_filename(),
+                                                   excel_export.state_workbook_bytes(records, names))
+        if st.session_state.get("state_workbook"):
+            filename, data = st.session_state.state_workbook
+            st.download_button(f"Download {filename}", data=data, file_name=filename,
+                               mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+        st.caption("Public bundle: precomputed cards and charts the Home and City pages are served from.")
+        if st.button("Publish Public Bundle"):
+            with st.spinner("Compiling public bundle..."):
+                version = public_bundle.publish_bundle()
+            st.success(f"Published bundle {version}. Public pages now show this version.")
+
+        st.caption("Parquet snapshot: all city data in one compressed file, used to seed a fresh server.")
+        if st.button("Export Snapshot"):
+            try:
+                path = city_snapshot.export_snapshot()
+                result = city_snapshot.upload_snapshot(parent_folder_id(), path)
+                st.success(f"Snapshot written ({os.path.getsize(path) / 1e3:.0f} kB) and {result.get('action')} on Google Drive.")
+            except Exception as e:
+                st.error(f"Snapshot export failed: {e}")
+
+    # --- Logout ---
+    with admin_tabs[4]:
         if st.button("Logout"):
             st.session_state.admin_logged_in = False
             st.success("Logged out successfully!")
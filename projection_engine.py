@@ -0,0 +1,141 @@
+# projection_engine.py
+"""
+Net-zero pathway projections for 2020-2050.
+
+Emissions are projected for all cities x scenarios x sectors x years as one
+NumPy broadcast from each city's sector GHG, its population growth
+(Population_5yr vs Population) and its sector Emission_Target. Temperature
+pathways combine the reference RCP curves with the per-year RCP values a city
+entered in the Climate Data tab. Results are cached per input hash.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import city_store
+import city_table
+
+YEARS = np.arange(2020, 2051)
+BASE_YEAR = 2020
+TARGET_YEAR = 2030          # sector Emission_Target (%) is reached by this year
+NET_ZERO_YEAR = 2050
+SCENARIOS = ["Business as Usual", "CAP Targets", "Net Zero 2050"]
+SECTORS = city_table.GHG_SECTORS
+SECTOR_TARGET_COLUMN = {
+    "Energy": "Energy_Target", "Buildings": "Energy_Target", "Industry": "Energy_Target",
+    "Transport": "Transport_Target", "Water": "Water_Target", "Waste": "Waste_Target",
+}
+# Reference warming curves (°C above pre-industrial), linear from 2020 to 2050
+RCP_PATHWAYS = {"RCP 4.5": (1.0, 2.0), "RCP 6.0": (1.0, 2.5), "RCP 8.5": (1.0, 3.5)}
+CITY_RCP = "City Input"
+
+CACHE_SIZE = 16
+_lock = threading.Lock()
+_cache = OrderedDict()   # input hash -> Projections
+
+@dataclass
+class Projections:
+    cities: list
+    emissions: np.ndarray      # (city, scenario, sector, year) tCO2e
+    temperature: np.ndarray    # (city, pathway, year) °C; NaN where a city entered no values
+    pathways: list
+
+    def _i(self, city):
+        return self.cities.index(city)
+
+    def city_emissions(self, city):
+        """
+        (scenario, year) totals over sectors for one city.
+        """
+        return self.emissions[self._i(city)].sum(axis=1)
+
+    def state_emissions(self):
+        """
+        (scenario, year) statewide totals.
+        """
+        return self.emissions.sum(axis=(0, 2))
+
+    def city_temperature(self, city):
+        """
+        {pathway: (year,) array} for one city; the city's own series only if it entered one.
+        """
+        t = self.temperature[self._i(city)]
+        return {p: t[k] for k, p in enumerate(self.pathways) if not np.isnan(t[k]).all()}
+
+def reference_temperature():
+    """
+    {pathway: (year,) array} of the reference RCP curves (the same for every city).
+    """
+    return {p: np.linspace(lo, hi, len(YEARS)) for p, (lo, hi) in RCP_PATHWAYS.items()}
+
+def _reference_temperature():
+    return np.stack(list(reference_temperature().values()))
+
+def emission_pathways(table):
+    """
+    (city, scenario, sector, year) emissions for every row of a city_table frame.
+    """
+    base = table[[city_table.ghg_column(s) for s in SECTORS]].astype("float64").fillna(0).to_numpy()   # (C, S)
+
+    pop = table["Basic_Population"].astype("float64").to_numpy()
+    # same fallback as emissions_engine: cities filled in only through Add/Update City
+    pop = np.where(np.isnan(pop) | (pop <= 0), table["Population_Total"].astype("float64").to_numpy(), pop)
+    pop_5yr = table["Population_5yr"].astype("float64").to_numpy()
+    valid = (pop > 0) & (pop_5yr > 0)
+    ratio = np.divide(pop_5yr, pop, out=np.ones_like(pop), where=valid)
+    growth = np.power(ratio, 1 / 5) - 1                                                                 # (C,)
+    t = YEARS - BASE_YEAR
+    growth_factor = np.power(1 + growth[:, None], t[None, :])                                          # (C, Y)
+    bau = base[:, :, None] * growth_factor[:, None, :]                                                  # (C, S, Y)
+
+    targets = np.stack([table[SECTOR_TARGET_COLUMN[s]].astype("float64").fillna(0).to_numpy() for s in SECTORS],
+                       axis=1) / 100.0                                                                  # (C, S)
+    ramp = np.clip(t / (TARGET_YEAR - BASE_YEAR), 0, 1)                                                 # (Y,)
+    cap = bau * (1 - targets[:, :, None] * ramp[None, None, :])
+    net_zero = bau * np.clip(1 - t / (NET_ZERO_YEAR - BASE_YEAR), 0, 1)[None, None, :]
+    return np.stack([bau, cap, net_zero], axis=1)
+
+def temperature_pathways(records, names):
+    """
+    (city, pathway, year) temperatures: the reference RCP curves for every city plus
+    the city's own entered series (NaN when all values were left at 0).
+    """
+    ref = _reference_temperature()                                                                     # (P, Y)
+    city_series = np.full((len(names), len(YEARS)), np.nan)
+    for i, name in enumerate(names):
+        rcp = records.get(name, {}).get("Climate_Data", {}).get("RCP")
+        if isinstance(rcp, list) and len(rcp) == len(YEARS) and any(rcp):
+            city_series[i] = np.asarray(rcp, dtype="float64")
+    return np.concatenate([np.broadcast_to(ref, (len(names),) + ref.shape), city_series[:, None, :]], axis=1)
+
+def _input_hash(table, records, names):
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(table, index=True).to_numpy().tobytes())
+    for name in names:
+        h.update(repr(records.get(name, {}).get("Climate_Data", {}).get("RCP")).encode("utf-8"))
+    return h.hexdigest()
+
+def get_projections():
+    """
+    Projections for every city in the store's current data, cached per input hash.
+    """
+    table = city_table.get_table()
+    cols = [city_table.ghg_column(s) for s in SECTORS] + ["Basic_Population", "Population_Total", "Population_5yr"] + sorted(set(SECTOR_TARGET_COLUMN.values()))
+    table = table[cols]
+    records = city_store.all_cities()
+    names = list(table.index)
+    key = _input_hash(table, records, names)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = Projections(cities=names, emissions=emission_pathways(table),
+                         temperature=temperature_pathways(records, names),
+                         pathways=list(RCP_PATHWAYS) + [CITY_RCP])
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
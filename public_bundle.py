@@ -0,0 +1,244 @@
+# public_bundle.py
+"""
+Read-only data bundle for the public Home and City pages.
+
+publish_bundle() compiles the current dataset into a static, versioned JSON
+file: statewide aggregates, one card per city and every public figure as
+Plotly JSON. While a bundle is active (see PUBLIC_SOURCE) the pages render
+straight from it, without the projection engine or any figure building per
+visit. Without a bundle, or in auto mode once the store has been edited since
+the bundle was compiled, they fall back to live data.
+
+    python public_bundle.py [--dir DIR]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import datetime
+import threading
+from local_cache import CACHE_DIR, write_json, read_json
+
+BUNDLE_DIR = os.environ.get("MAHACAP_BUNDLE_DIR") or os.path.join(CACHE_DIR, "public_bundle")
+# auto: use the latest bundle while it matches the store's data version (edits since fall back to live);
+# bundle: always (public-only containers); live: never
+PUBLIC_SOURCE = os.environ.get("MAHACAP_PUBLIC_SOURCE", "auto")
+LATEST_FILE = "LATEST.json"
+BUNDLE_FORMAT = 1
+KEEP_VERSIONS = 5
+
+_lock = threading.Lock()
+_loaded = {"version": None, "bundle": None, "checked": 0.0}
+_figures = {}   # (version, page, city, chart) -> plotly Figure
+RECHECK_SECONDS = 5
+
+class BundleMissing(RuntimeError):
+    pass
+
+# -------------------- Cards --------------------
+def home_card(summary, records):
+    """
+    Values shown in the Home page cards.
+    """
+    city_info = records.get(summary["profile_city"], {}) if summary.get("profile_city") else {}
+    return {
+        "total_cities": summary.get("total_cities"),
+        "status_counts": summary["status_counts"],
+        "cap_status": city_info.get("CAP_Status", "Not Started") if city_info else "",
+        "cap_link": city_info.get("CAP_Link", ""),
+        "total_population": summary["total_population"],
+        "total_area": summary["total_area"],
+        "dept_name": city_info.get("Dept_Name", ""),
+        "dept_email": city_info.get("Dept_Email", ""),
+        "website": city_info.get("Website", ""),
+    }
+
+def city_card(city_info):
+    """
+    Values shown in the City page cards.
+    """
+    return {
+        "cap_status": city_info.get("CAP_Status", "Not Started"),
+        "cap_link": city_info.get("CAP_Link", ""),
+        "population": city_info.get("Basic Info", {}).get("Population", 0),
+        "area": city_info.get("Basic Info", {}).get("Area", 0),
+        "dept_name": city_info.get("Dept_Name", ""),
+        "dept_email": city_info.get("Dept_Email", ""),
+        "website": city_info.get("Website", ""),
+    }
+
+# -------------------- Live data --------------------
+def _live_home():
+    import city_store
+    import charts
+    import figure_cache
+    from city_list import cities
+    summary = city_store.get_summary()
+    card = home_card(dict(summary, total_cities=len(cities)), city_store.all_cities())
+    version = city_store.data_version()
+    builders = {
+        "ghg_by_sector": (version, lambda: charts.home_ghg_figure(summary)),
+        "pathways": (version, charts.home_pathways_figure),
+        "rcp": (figure_cache.STATIC, charts.home_rcp_figure),
+    }
+    figures = {k: figure_cache.get_figure(f"home_{k}", None, v, build) for k, (v, build) in builders.items()}
+    return card, figures
+
+def _live_city(city):
+    import city_store
+    import charts
+    import figure_cache
+    version = city_store.city_version(city)
+    builders = {"ghg_by_sector": charts.city_ghg_figure, "rcp": charts.city_rcp_figure, "pathways": charts.city_pathways_figure}
+    figures = {k: figure_cache.get_figure(f"city_{k}", city, version, lambda b=b: b(city)) for k, b in builders.items()}
+    return city_card(city_store.get_city(city)), figures
+
+# -------------------- Compile / publish --------------------
+def _figure_data(fig, templates):
+    """
+    Figure JSON with its layout template moved into the shared templates table
+    (every chart uses plotly_dark; storing it once keeps the bundle small).
+    """
+    data = json.loads(fig.to_json())
+    template = data.get("layout", {}).pop("template", None)
+    if template is not None:
+        key = hashlib.md5(json.dumps(template, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+        templates.setdefault(key, template)
+        data["layout"]["_template"] = key
+    return data
+
+def compile_bundle():
+    """
+    The current dataset as a bundle dict (aggregates, cards and figure JSON for every page).
+    """
+    import city_store
+    from city_list import cities
+    home, home_figures = _live_home()
+    records = city_store.all_cities()
+    names = list(cities) + [c for c in records if c not in cities]
+    city_cards, city_figures, templates = {}, {}, {}
+    for c in names:
+        card, figures = _live_city(c)
+        city_cards[c] = card
+        city_figures[c] = {k: _figure_data(f, templates) for k, f in figures.items()}
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "data_version": city_store.data_version(),
+        "cities": names,
+        "home": {"card": home, "figures": {k: _figure_data(f, templates) for k, f in home_figures.items()}},
+        "city_cards": city_cards,
+        "city_figures": city_figures,
+        "templates": templates,
+    }
+    digest = hashlib.md5(json.dumps(bundle, sort_keys=True).encode("utf-8")).hexdigest()[:10]
+    bundle["version"] = f"{datetime.datetime.now():%Y%m%d%H%M%S}-{digest}"
+    bundle["generated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    return bundle
+
+def publish_bundle(bundle_dir=BUNDLE_DIR):
+    """
+    Compile and write a new bundle version, point LATEST at it and drop old versions.
+    Returns the version.
+    """
+    bundle = compile_bundle()
+    version = bundle["version"]
+    write_json(os.path.join(bundle_dir, f"bundle-{version}.json"), bundle)
+    write_json(os.path.join(bundle_dir, LATEST_FILE), {"version": version, "generated_at": bundle["generated_at"]})
+    old = sorted(f for f in os.listdir(bundle_dir) if f.startswith("bundle-") and f.endswith(".json"))
+    for f in old[:-KEEP_VERSIONS]:
+        try:
+            os.remove(os.path.join(bundle_dir, f))
+        except OSError:
+            pass
+    return version
+
+# -------------------- Load / serve --------------------
+def load_bundle(bundle_dir=BUNDLE_DIR):
+    """
+    The latest published bundle (parsed once per version), or None if none is published.
+    LATEST is re-read at most every RECHECK_SECONDS.
+    """
+    now = time.time()
+    with _lock:
+        if now - _loaded["checked"] < RECHECK_SECONDS:
+            return _loaded["bundle"]
+        _loaded["checked"] = now
+        latest = read_json(os.path.join(bundle_dir, LATEST_FILE), None)
+        if not latest:
+            _loaded.update(version=None, bundle=None)
+            return None
+        if latest["version"] != _loaded["version"]:
+            bundle = read_json(os.path.join(bundle_dir, f"bundle-{latest['version']}.json"), None)
+            if bundle is None:
+                return _loaded["bundle"]
+            _loaded.update(version=latest["version"], bundle=bundle)
+            _figures.clear()
+        return _loaded["bundle"]
+
+def active_bundle():
+    """
+    The bundle the public pages should render from, or None to use live data.
+    In auto mode a bundle older than the store (edits saved after it was compiled) is not used.
+    """
+    if PUBLIC_SOURCE == "live":
+        return None
+    bundle = load_bundle()
+    if bundle is None and PUBLIC_SOURCE == "bundle":
+        raise BundleMissing(f"No public bundle published in {BUNDLE_DIR}")
+    if bundle is not None and PUBLIC_SOURCE == "auto":
+        import city_store
+        if city_store.data_version() > bundle.get("data_version", 0):
+            return None
+    return bundle
+
+def _figure(bundle, page, city, chart, data):
+    key = (bundle["version"], page, city, chart)
+    with _lock:
+        fig = _figures.get(key)
+    if fig is None:
+        import plotly.graph_objects as go
+        layout = dict(data.get("layout", {}))
+        template = layout.pop("_template", None)
+        if template is not None:
+            layout["template"] = bundle["templates"][template]
+        fig = go.Figure(dict(data, layout=layout))
+        with _lock:
+            _figures[key] = fig
+    return fig
+
+def home_view(live=False):
+    """
+    (card, {chart: figure}) for the Home page. live=True skips the bundle.
+    Raises BundleMissing in bundle mode when nothing has been published.
+    """
+    bundle = None if live else active_bundle()
+    if bundle is None:
+        return _live_home()
+    home = bundle["home"]
+    return home["card"], {k: _figure(bundle, "home", None, k, d) for k, d in home["figures"].items()}
+
+def city_view(city, live=False):
+    """
+    (card, {chart: figure}) for one city on the City page. live=True skips the bundle.
+    Raises BundleMissing in bundle mode when nothing has been published.
+    """
+    bundle = None if live else active_bundle()
+    if bundle is None:
+        return _live_city(city)
+    if city not in bundle["city_cards"]:
+        return city_card({}), {}
+    figures = bundle["city_figures"][city]
+    return bundle["city_cards"][city], {k: _figure(bundle, "city", city, k, d) for k, d in figures.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish the read-only data bundle for the public pages.")
+    parser.add_argument("--dir", default=BUNDLE_DIR, help=f"Bundle directory (default: {BUNDLE_DIR})")
+    args = parser.parse_args(argv)
+    version = publish_bundle(args.dir)
+    print(f"Published bundle {version} to {args.dir}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
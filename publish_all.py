@@ -0,0 +1,218 @@
+# publish_all.py
+"""
+Statewide "publish all cities" job: generate GHG Excel/PDF files for every city
+and upload them to each city's Drive folder.
+
+Generation runs in a process pool (spawned, never forked), uploads run in a
+thread pool. Progress is checkpointed after every city, so a crashed run can be
+resumed with --resume. The admin panel starts this CLI as a background process
+(start_background_run) and polls the checkpoint.
+
+    python publish_all.py --source city_data.json
+    python publish_all.py --source store
+    python publish_all.py --source drive --resume <run_id>
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from city_list import cities
+from local_cache import cache_path, read_json, write_json
+from json_utils import to_jsonable
+
+GENERATE_WORKERS = int(os.environ.get("PUBLISH_GENERATE_WORKERS", str(os.cpu_count() or 2)))
+UPLOAD_WORKERS = int(os.environ.get("PUBLISH_UPLOAD_WORKERS", "8"))
+
+def _run_file(run_id):
+    return cache_path("publish_runs", f"{run_id}.json")
+
+def load_run(run_id):
+    return read_json(_run_file(run_id), None)
+
+def _save_run(run):
+    write_json(_run_file(run["run_id"]), run)
+
+_processes = {}   # run_id -> Popen, for runs started by this process
+
+def new_run_id():
+    return time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+
+def run_log(run_id):
+    return cache_path("publish_runs", f"{run_id}.log")
+
+def start_background_run(parent_id=None, run_id=None, save_state=False):
+    """
+    Publish the city store's data in a separate `python publish_all.py --source store` process
+    (output in run_log(run_id)). Returns the run ID; poll load_run() for progress.
+    """
+    run_id = run_id or new_run_id()
+    cmd = [sys.executable, os.path.abspath(__file__), "--source", "store", "--resume", run_id]
+    if parent_id:
+        cmd += ["--parent-id", parent_id]
+    if save_state:
+        cmd.append("--save-state")
+    with open(run_log(run_id), "ab") as log:
+        _processes[run_id] = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=log,
+                                              stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                              start_new_session=True)
+    return run_id
+
+def background_exit_code(run_id):
+    """
+    Exit code of a run started by start_background_run in this process (None while running or unknown).
+    """
+    proc = _processes.get(run_id)
+    return proc.poll() if proc else None
+
+def load_city_data_from_drive(parent_id=None, city_names=None):
+    """
+    Load every city's saved state (snapshot + change log) from Drive.
+    Returns (city_data, failed): {city: state} (cities without a folder or state are left out)
+    and {city: error} for cities whose state could not be downloaded completely.
+    """
+    from drive_upload import load_folder_index
+    from state_drive import prefetch_states
+
+    folders = load_folder_index(parent_id)
+    names = [c for c in city_names or cities if c in folders]
+    # one batched listing + parallel downloads instead of a list/download pair per city
+    states, failed = prefetch_states([folders[c] for c in names])
+    return ({c: states[folders[c]] for c in names if folders[c] in states},
+            {c: str(failed[folders[c]]) for c in names if folders[c] in failed})
+
+def _generate(city_name, city_data):
+    """
+    Process-pool worker: build the GHG Excel and PDF and the CAP report for one city in memory.
+    Returns [(filename, bytes, mimetype, content_key), ...].
+    """
+    from export_city_files import generate_city_artifacts
+    return generate_city_artifacts(city_name, city_data)
+
+def _upload(city_name, city_data, blobs, parent_id, save_state):
+    """
+    Thread-pool worker: upload one city's files (and optionally state.json) to its folder.
+    """
+    from drive_upload import get_or_create_folder
+    from upload_pipeline import upload_city_artifacts
+
+    folder_id = get_or_create_folder(city_name, parent_id=parent_id)
+    result = upload_city_artifacts(folder_id, state=city_data if save_state else None,
+                                   blobs=blobs, max_workers=1)
+    links = {r.name: (r.value or {}).get("webViewLink", "") for r in result.results.values() if r.ok}
+    errors = {r.name: r.error for r in result.failed}
+    return folder_id, links, errors
+
+def publish_all(city_data, parent_id=None, run_id=None, save_state=False, progress=None,
+                generate_workers=GENERATE_WORKERS, upload_workers=UPLOAD_WORKERS, load_errors=None):
+    """
+    Generate and upload GHG files for every city in city_data.
+
+    city_data: {city name: city record}. Cities already marked "done" in the
+    checkpoint for run_id are skipped, which makes a crashed run resumable.
+    progress: optional callback(done, total, city_name, status).
+    load_errors: {city name: error} for cities whose data could not be loaded; reported as failed.
+    Returns the run report {"run_id", "started", "finished", "cities": {name: {...}}}.
+    """
+    run = load_run(run_id) if run_id else None
+    if run is None:
+        run = {"run_id": run_id or new_run_id(), "started": time.time(), "finished": None, "cities": {}}
+    report = run["cities"]
+
+    todo = [c for c in cities if c in city_data and report.get(c, {}).get("status") != "done"]
+    for c, error in (load_errors or {}).items():
+        if c not in city_data and report.get(c, {}).get("status") != "done":
+            report[c] = {"status": "failed", "error": f"load: {error}"}
+    for c in cities:
+        if c not in city_data and c not in report:
+            report[c] = {"status": "skipped", "error": "No data for city"}
+    total = len(todo)
+    done = 0
+    # progress of this pass, for callers polling the checkpoint
+    run.update(total=total, processed=0, finished=None)
+    _save_run(run)
+
+    def _finish(city, entry):
+        nonlocal done
+        done += 1
+        report[city] = entry
+        run["processed"] = done
+        _save_run(run)
+        if progress:
+            progress(done, total, city, entry["status"])
+
+    # spawn: forking a process that runs threads (e.g. the Streamlit server) can copy held locks
+    with ProcessPoolExecutor(max_workers=max(1, generate_workers),
+                             mp_context=multiprocessing.get_context("spawn")) as gen_pool, \
+            ThreadPoolExecutor(max_workers=max(1, upload_workers)) as up_pool:
+        records = {c: to_jsonable(city_data[c]) for c in todo}
+        gen_futures = {gen_pool.submit(_generate, c, records[c]): c for c in todo}
+        up_futures = {}
+        for fut in as_completed(gen_futures):
+            c = gen_futures[fut]
+            try:
+                blobs = fut.result()
+            except Exception as e:
+                _finish(c, {"status": "failed", "error": f"generate: {e}"})
+                continue
+            up_futures[up_pool.submit(_upload, c, records[c], blobs, parent_id, save_state)] = c
+
+        for fut in as_completed(up_futures):
+            c = up_futures[fut]
+            try:
+                folder_id, links, errors = fut.result()
+            except Exception as e:
+                _finish(c, {"status": "failed", "error": f"upload: {e}"})
+                continue
+            if errors:
+                _finish(c, {"status": "failed", "folder_id": folder_id, "links": links,
+                            "error": "; ".join(f"{k}: {v}" for k, v in errors.items())})
+            else:
+                _finish(c, {"status": "done", "folder_id": folder_id, "links": links})
+
+    run["finished"] = time.time()
+    _save_run(run)
+    return run
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate and upload GHG files for all cities.")
+    parser.add_argument("--source", required=True,
+                        help='"drive" (saved state.json files), "store" (the local city store) or a JSON file {city: data}')
+    parser.add_argument("--parent-id", default=os.environ.get("PARENT_FOLDER_ID"), help="Drive parent folder (default: $PARENT_FOLDER_ID)")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="resume a previous run, skipping cities already done (a new ID starts a run under that ID)")
+    parser.add_argument("--save-state", action="store_true", help="also write state.json to each city folder")
+    parser.add_argument("--generate-workers", type=int, default=GENERATE_WORKERS)
+    parser.add_argument("--upload-workers", type=int, default=UPLOAD_WORKERS)
+    args = parser.parse_args(argv)
+
+    load_errors = {}
+    if args.source == "drive":
+        city_data, load_errors = load_city_data_from_drive(args.parent_id)
+    elif args.source == "store":
+        import city_store
+        city_data = city_store.all_cities()
+    else:
+        with open(args.source, "r", encoding="utf-8") as f:
+            city_data = json.load(f)
+
+    def _print_progress(done, total, city, status):
+        print(f"[{done}/{total}] {city}: {status}", flush=True)
+
+    run = publish_all(city_data, parent_id=args.parent_id, run_id=args.resume, save_state=args.save_state,
+                      progress=_print_progress, generate_workers=args.generate_workers,
+                      upload_workers=args.upload_workers, load_errors=load_errors)
+
+    failed = {c: e for c, e in run["cities"].items() if e["status"] == "failed"}
+    ok = sum(1 for e in run["cities"].values() if e["status"] == "done")
+    print(f"Run {run['run_id']}: {ok} done, {len(failed)} failed, report at {_run_file(run['run_id'])}")
+    for c, e in failed.items():
+        print(f"  {c}: {e.get('error')}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
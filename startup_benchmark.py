@@ -0,0 +1,126 @@
+# startup_benchmark.py
+"""
+Startup-time benchmark for each page of mahacap.py.
+
+Every page is measured in a fresh Python process (nothing imported, empty
+module caches), using Streamlit's AppTest to run the script headless:
+
+    cold start   wall time of the whole process (interpreter + streamlit + first run)
+    first paint  the first script run for the page (app imports + first render)
+    rerun        a second run in the same process (what every later interaction costs)
+
+It also lists which heavy stacks each page pulled into the process; the public
+pages should never load googleapiclient, fpdf or openpyxl.
+
+    python startup_benchmark.py [--pages Home City ...] [--repeat N] [--json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mahacap.py")
+HEAVY_MODULES = ["googleapiclient", "fpdf", "openpyxl", "xlsxwriter", "pypdf", "pandas", "plotly.express"]
+PUBLIC_PAGES = ["Home", "City"]
+# page label -> session_state the run starts from
+PAGES = {
+    "Home": {"current_page": "Home"},
+    "City": {"current_page": "City"},
+    "Admin (login)": {"current_page": "Admin"},
+    "Admin (logged in)": {"current_page": "Admin", "admin_logged_in": True},
+}
+RUN_TIMEOUT = 120
+
+def _measure(page):
+    """
+    Child process: run one page twice and print the timings as JSON.
+    """
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    framework = time.perf_counter() - t0
+
+    at = AppTest.from_file(APP_FILE, default_timeout=RUN_TIMEOUT)
+    for key, value in PAGES[page].items():
+        at.session_state[key] = value
+    t1 = time.perf_counter()
+    at.run()
+    first_paint = time.perf_counter() - t1
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    t2 = time.perf_counter()
+    at.run()
+    rerun = time.perf_counter() - t2
+    print(json.dumps({
+        "page": page,
+        "framework": framework,
+        "first_paint": first_paint,
+        "rerun": rerun,
+        "heavy_modules": loaded,
+        "exceptions": [e.value for e in at.exception],
+    }))
+
+def measure_page(page):
+    """
+    Timings for one page from a fresh interpreter (cold_start is the whole process wall time).
+    """
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", page],
+                         capture_output=True, text=True, cwd=os.path.dirname(APP_FILE))
+    cold_start = time.perf_counter() - t0
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if out.returncode or not lines:
+        raise RuntimeError(f"{page}: benchmark run failed\n{out.stderr[-2000:]}")
+    result = json.loads(lines[-1])
+    result["cold_start"] = cold_start
+    return result
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run_benchmark(pages=None, repeat=1):
+    """
+    {page: timings} with the median of `repeat` cold runs per page.
+    """
+    results = {}
+    for page in pages or PAGES:
+        runs = [measure_page(page) for _ in range(repeat)]
+        result = dict(runs[-1])
+        for key in ("cold_start", "framework", "first_paint", "rerun"):
+            result[key] = _median([r[key] for r in runs])
+        results[page] = result
+    return results
+
+def format_report(results):
+    lines = [f"{'Page':<20}{'cold start':>12}{'first paint':>13}{'rerun':>9}  heavy modules loaded",
+             "-" * 90]
+    for page, r in results.items():
+        modules = ", ".join(r["heavy_modules"]) or "-"
+        lines.append(f"{page:<20}{r['cold_start']:>11.2f}s{r['first_paint']:>12.2f}s{r['rerun']:>8.2f}s  {modules}")
+        for e in r["exceptions"]:
+            lines.append(f"{'':<20}exception: {e}")
+    forbidden = {"googleapiclient", "fpdf", "openpyxl"}
+    leaks = {p: sorted(forbidden & set(r["heavy_modules"])) for p, r in results.items() if p in PUBLIC_PAGES}
+    leaks = {p: m for p, m in leaks.items() if m}
+    lines.append("")
+    lines.append("Public pages load no Drive/PDF/openpyxl stacks." if not leaks else f"Public pages load admin stacks: {leaks}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start and first-paint time for each page of the app.")
+    parser.add_argument("--pages", nargs="+", choices=list(PAGES), help="Pages to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Cold runs per page; the median is reported")
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _measure(args.child)
+        return 0
+    results = run_benchmark(args.pages, args.repeat)
+    print(json.dumps(results, indent=2) if args.json else format_report(results))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,46 +1,303 @@
 # state_drive.py (NEW file)
+import os
+import copy
 import json
+import time
+import uuid
+import threading
 from io import BytesIO
-from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
-from gdrive_auth import get_drive_service
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from googleapiclient.http import MediaIoBaseUpload
+from gdrive_auth import get_drive_service, execute
+from drive_sync import sync_bytes, content_hash
+from drive_download import download_file, DOWNLOAD_WORKERS
+from json_utils import to_jsonable, stable_json_bytes
+
+# Per-city change log: small append-only change files next to the state.json snapshot
+CHANGE_PREFIX = "state-change-"
+COMPACT_AFTER = int(os.environ.get("STATE_COMPACT_AFTER", "20"))
+
+# Process-level state cache: revalidated with a metadata-only listing after the TTL
+STATE_CACHE_TTL = int(os.environ.get("STATE_CACHE_TTL", "60"))
+STATE_CACHE_SIZE = 128
+FILE_CACHE_SIZE = 1024
+_state_cache = OrderedDict()   # folder_id -> {"checked": ts, "fingerprint": ..., "state": dict}
+_file_cache = OrderedDict()    # (file_id, modifiedTime) -> parsed JSON
+_cache_lock = threading.Lock()
+PREFETCH_BATCH = 20            # folders per Drive listing query in prefetch_states()
+_prefetch_started = False
 
 def _escape(s: str) -> str:
     return s.replace("'", "\\'")
 
-def save_state_json_to_folder(folder_id, state_dict, filename="state.json"):
+# -------------------- Change log --------------------
+def diff_state(old, new, path=(), deletions=True):
+    """
+    Field-level diff between two JSON-like dicts.
+    Returns ops: {"op": "set", "path": [...], "value": v} or {"op": "del", "path": [...]}.
+    deletions=False gives a set-only diff: keys missing from new are left alone.
+    """
+    ops = []
+    old = old or {}
+    for k, v in new.items():
+        p = list(path) + [k]
+        if k not in old:
+            ops.append({"op": "set", "path": p, "value": v})
+        elif isinstance(v, dict) and isinstance(old[k], dict):
+            ops.extend(diff_state(old[k], v, p, deletions))
+        elif old[k] != v:
+            ops.append({"op": "set", "path": p, "value": v})
+    for k in old if deletions else ():
+        if k not in new:
+            ops.append({"op": "del", "path": list(path) + [k]})
+    return ops
+
+def apply_changes(state, ops):
+    """
+    Apply diff_state ops to state in place and return it.
+    """
+    for op in ops:
+        node = state
+        for k in op["path"][:-1]:
+            if not isinstance(node.get(k), dict):
+                node[k] = {}
+            node = node[k]
+        last = op["path"][-1]
+        if op["op"] == "set":
+            node[last] = op["value"]
+        else:
+            node.pop(last, None)
+    return state
+
+def _list_files(q):
     service = get_drive_service()
-    # Delete existing state.json in folder (optional)
-    q = f"name = '{_escape(filename)}' and '{folder_id}' in parents and trashed = false"
-    existing = service.files().list(q=q, spaces='drive', fields='files(id,name)').execute().get('files', [])
-    for f in existing:
+    files, page_token = [], None
+    while True:
+        resp = execute(service.files().list(q=q, spaces='drive', pageSize=1000, pageToken=page_token,
+                                            fields='nextPageToken, files(id,name,parents,size,modifiedTime,md5Checksum,appProperties)'))
+        files.extend(resp.get('files', []))
+        page_token = resp.get('nextPageToken')
+        if not page_token:
+            break
+    return files
+
+def _state_query(filename):
+    return f"trashed = false and (name = '{_escape(filename)}' or name contains '{CHANGE_PREFIX}')"
+
+def _list_state_files(folder_id, filename='state.json'):
+    """
+    One listing of the snapshot and all change files in a city folder.
+    Returns (snapshot file or None, change files sorted oldest first).
+    """
+    return _split_state_files(_list_files(f"'{folder_id}' in parents and {_state_query(filename)}"), filename)
+
+def _split_state_files(files, filename):
+    snapshot = next((f for f in files if f['name'] == filename), None)
+    through = ((snapshot or {}).get('appProperties') or {}).get('logThrough', '')
+    changes = sorted((f for f in files if f['name'].startswith(CHANGE_PREFIX) and f['name'] > through),
+                     key=lambda f: f['name'])
+    return snapshot, changes
+
+def _download_json(f):
+    """
+    Download and parse a state/change file, reusing the copy cached for the same (id, modifiedTime).
+    """
+    key = (f['id'], f.get('modifiedTime'))
+    with _cache_lock:
+        if key in _file_cache:
+            _file_cache.move_to_end(key)
+            return copy.deepcopy(_file_cache[key])
+    value = json.loads(download_file(f['id'], f.get('md5Checksum'), f.get('size')))
+    with _cache_lock:
+        _file_cache[key] = value
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+    return copy.deepcopy(value)
+
+def _replay(snapshot, changes):
+    """
+    The snapshot with the change files applied in order. Download errors propagate:
+    a state with a change file missing would look complete but be silently stale.
+    """
+    state = _download_json(snapshot) if snapshot else None
+    for f in changes:
+        record = _download_json(f)
+        state = apply_changes(state if state is not None else {}, record.get("ops", []))
+    return state
+
+def load_state(folder_id, filename='state.json'):
+    """
+    Load a city's state: the state.json snapshot with the change log replayed on top.
+    Returns None when the folder has neither.
+    """
+    snapshot, changes = _list_state_files(folder_id, filename)
+    return _replay(snapshot, changes)
+
+def load_state_cached(folder_id, filename='state.json', ttl=STATE_CACHE_TTL):
+    """
+    load_state() behind a process-wide LRU cache keyed by folder and file modifiedTimes.
+    Within ttl seconds no Drive call is made; after that a metadata-only listing decides
+    whether anything changed, and only new or modified files are downloaded.
+    A failed download raises and leaves the cache untouched, so a partial state is never served.
+    """
+    now = time.time()
+    with _cache_lock:
+        entry = _state_cache.get(folder_id)
+        if entry and now - entry["checked"] < ttl:
+            _state_cache.move_to_end(folder_id)
+            return copy.deepcopy(entry["state"])
+
+    snapshot, changes = _list_state_files(folder_id, filename)
+    return copy.deepcopy(_cache_state(folder_id, snapshot, changes, entry, now))
+
+def _cache_state(folder_id, snapshot, changes, entry=None, now=None):
+    fingerprint = tuple((f['id'], f.get('modifiedTime')) for f in ([snapshot] if snapshot else []) + changes)
+    if entry and entry["fingerprint"] == fingerprint:
+        state = entry["state"]
+    else:
+        # raises on any failed download: only complete replays are cached
+        state = _replay(snapshot, changes)
+
+    with _cache_lock:
+        _state_cache[folder_id] = {"checked": time.time() if now is None else now, "fingerprint": fingerprint, "state": state}
+        _state_cache.move_to_end(folder_id)
+        while len(_state_cache) > STATE_CACHE_SIZE:
+            _state_cache.popitem(last=False)
+    return state
+
+def prefetch_states(folder_ids, filename='state.json', workers=DOWNLOAD_WORKERS):
+    """
+    Load many cities' states in one sweep: a few batched listings (PREFETCH_BATCH folders
+    per query) and all snapshot/change downloads in parallel. Fills the load_state_cached()
+    cache for the folders that loaded completely.
+    Returns (states, failed): {folder_id: state} for folders that have a state, and
+    {folder_id: error} for folders where a download failed (not cached, not in states).
+    """
+    folder_ids = list(dict.fromkeys(folder_ids))
+    by_folder = {fid: [] for fid in folder_ids}
+    for i in range(0, len(folder_ids), PREFETCH_BATCH):
+        batch = folder_ids[i:i + PREFETCH_BATCH]
+        parents = " or ".join(f"'{fid}' in parents" for fid in batch)
+        for f in _list_files(f"({parents}) and {_state_query(filename)}"):
+            for p in f.get('parents', []):
+                if p in by_folder:
+                    by_folder[p].append(f)
+
+    listings = {fid: _split_state_files(files, filename) for fid, files in by_folder.items()}
+    files = [f for snapshot, changes in listings.values() for f in ([snapshot] if snapshot else []) + changes]
+
+    def _fetch(f):
         try:
-            service.files().delete(fileId=f['id']).execute()
-        except Exception:
-            pass
+            _download_json(f)
+        except Exception as e:
+            return f['id'], e
+        return f['id'], None
 
-    bytes_io = BytesIO()
-    bytes_io.write(json.dumps(state_dict, ensure_ascii=False, indent=2).encode('utf-8'))
-    bytes_io.seek(0)
-    media = MediaIoBaseUpload(bytes_io, mimetype='application/json', resumable=False)
-    meta = {'name': filename, 'parents': [folder_id]}
-    created = service.files().create(body=meta, media_body=media, fields='id').execute()
-    return created
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # warm the file cache in parallel; _replay below then only reads from it
+        errors = {fid: e for fid, e in pool.map(_fetch, files) if e is not None}
 
-def load_state_json_from_folder(folder_id, filename='state.json'):
-    service = get_drive_service()
-    q = f"name = '{_escape(filename)}' and '{folder_id}' in parents and trashed = false"
-    resp = service.files().list(q=q, spaces='drive', fields='files(id,name)', pageSize=1).execute()
-    files = resp.get('files', [])
-    if not files:
-        return None
-    file_id = files[0]['id']
-    fh = BytesIO()
-    downloader = MediaIoBaseDownload(fh, service.files().get_media(fileId=file_id))
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
+    states, failed = {}, {}
+    for fid, (snapshot, changes) in listings.items():
+        error = next((errors[f['id']] for f in ([snapshot] if snapshot else []) + changes if f['id'] in errors), None)
+        if error is None:
+            try:
+                state = _cache_state(fid, snapshot, changes)
+            except Exception as e:
+                error = e
+        if error is not None:
+            failed[fid] = error
+        elif state:
+            states[fid] = copy.deepcopy(state)
+    return states, failed
+
+def _safe(fn, *args):
     try:
-        return json.load(fh)
+        return fn(*args)
     except Exception:
         return None
+
+def start_prefetch(parent_id=None, city_names=None):
+    """
+    Prefetch every city's state (all listed cities by default) in a background thread, once per process.
+    """
+    global _prefetch_started
+    with _cache_lock:
+        if _prefetch_started:
+            return
+        _prefetch_started = True
+
+    def run():
+        from drive_upload import load_folder_index
+        from city_list import cities
+        def sweep():
+            folders = load_folder_index(parent_id)
+            return prefetch_states([folders[c] for c in city_names or cities if c in folders])
+        _safe(sweep)
+
+    threading.Thread(target=run, name="state-prefetch", daemon=True).start()
+
+def invalidate_state_cache(folder_id=None):
+    """
+    Force the next load_state_cached() for folder_id (or every folder) to revalidate against Drive.
+    """
+    with _cache_lock:
+        if folder_id is None:
+            _state_cache.clear()
+        else:
+            _state_cache.pop(folder_id, None)
+
+def save_state_changes(folder_id, state_dict, base_state=None, filename='state.json'):
+    """
+    Append only the fields that differ from base_state as one small change file.
+    base_state is the state this edit started from, so admins editing different
+    sections never overwrite each other. Without it the diff is taken against the
+    current Drive state and is set-only: fields missing locally are never deleted.
+    Returns the change file resource, or None when nothing changed.
+    """
+    new_state = to_jsonable(state_dict)
+    snapshot, changes = _list_state_files(folder_id, filename)
+    if base_state is None:
+        ops = diff_state(_replay(snapshot, changes) or {}, new_state, deletions=False)
+    else:
+        ops = diff_state(to_jsonable(base_state), new_state)
+    if not ops:
+        return None
+
+    name = f"{CHANGE_PREFIX}{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}.json"
+    record = {"ts": time.time(), "ops": ops}
+    media = MediaIoBaseUpload(BytesIO(json.dumps(record, ensure_ascii=False).encode('utf-8')),
+                              mimetype='application/json', resumable=False)
+    service = get_drive_service()
+    created = execute(service.files().create(body={'name': name, 'parents': [folder_id]},
+                                             media_body=media, fields='id,name'))
+    invalidate_state_cache(folder_id)
+    if len(changes) + 1 >= COMPACT_AFTER:
+        try:
+            compact_state(folder_id, filename)
+        except Exception:
+            # compaction is an optimisation; the log stays valid without it
+            pass
+    return created
+
+def compact_state(folder_id, filename='state.json'):
+    """
+    Fold the change log into the state.json snapshot and delete the folded change files.
+    """
+    snapshot, changes = _list_state_files(folder_id, filename)
+    if not changes:
+        return snapshot
+    state = _replay(snapshot, changes) or {}
+    through = changes[-1]['name']
+    data = stable_json_bytes(state)
+    written = sync_bytes(folder_id, filename, data, mimetype='application/json', remove_duplicates=True,
+                         content_key=f"{content_hash(data)}@{through}", app_properties={'logThrough': through})
+    service = get_drive_service()
+    for f in changes:
+        try:
+            execute(service.files().delete(fileId=f['id']))
+        except Exception:
+            pass
+    invalidate_state_cache(folder_id)
+    return written
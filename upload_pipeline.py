@@ -0,0 +1,124 @@
+# upload_pipeline.py
+import os
+import time
+import random
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from googleapiclient.errors import HttpError
+from drive_upload import upload_file_to_folder
+from drive_sync import sync_bytes
+from state_drive import save_state_changes
+
+MAX_WORKERS = int(os.environ.get("UPLOAD_MAX_WORKERS", "4"))
+MAX_RETRIES = int(os.environ.get("UPLOAD_MAX_RETRIES", "5"))
+BASE_DELAY = 1.0
+MAX_DELAY = 32.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+def is_retryable(exc):
+    """
+    True for Drive errors worth retrying: 429, 5xx, 403 rate limits and dropped connections.
+    """
+    if isinstance(exc, HttpError):
+        status = int(getattr(exc.resp, "status", 0) or 0)
+        if status in RETRYABLE_STATUS:
+            return True
+        return status == 403 and any(r in str(exc) for r in RATE_LIMIT_REASONS)
+    return isinstance(exc, (ConnectionError, TimeoutError, socket.timeout))
+
+def call_with_retry(fn, *args, retries=MAX_RETRIES, base_delay=BASE_DELAY, **kwargs):
+    """
+    Call fn with exponential backoff (plus jitter) on retryable errors.
+    Returns (value, attempts).
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(*args, **kwargs), attempt + 1
+        except Exception as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = min(MAX_DELAY, base_delay * (2 ** attempt))
+            time.sleep(delay + random.uniform(0, base_delay))
+            attempt += 1
+
+@dataclass
+class UploadTask:
+    name: str
+    fn: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+
+@dataclass
+class TaskResult:
+    name: str
+    ok: bool
+    value: object = None
+    error: str = ""
+    attempts: int = 0
+    seconds: float = 0.0
+
+@dataclass
+class UploadResult:
+    folder_id: str
+    results: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return all(r.ok for r in self.results.values())
+
+    @property
+    def failed(self):
+        return [r for r in self.results.values() if not r.ok]
+
+    def get(self, name):
+        return self.results.get(name)
+
+def _run_task(task):
+    started = time.time()
+    try:
+        value, attempts = call_with_retry(task.fn, *task.args, **task.kwargs)
+        return TaskResult(task.name, True, value=value, attempts=attempts, seconds=time.time() - started)
+    except Exception as e:
+        return TaskResult(task.name, False, error=str(e), seconds=time.time() - started)
+
+def run_uploads(tasks, folder_id=None, max_workers=MAX_WORKERS):
+    """
+    Run upload tasks concurrently on a bounded thread pool.
+    Each task is retried independently; returns one UploadResult.
+    """
+    started = time.time()
+    result = UploadResult(folder_id=folder_id)
+    if not tasks:
+        return result
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks)))) as pool:
+        for r in pool.map(_run_task, tasks):
+            result.results[r.name] = r
+    result.seconds = time.time() - started
+    return result
+
+def upload_city_artifacts(folder_id, state=None, files=(), blobs=(), make_public=False, max_workers=MAX_WORKERS,
+                          state_base=None):
+    """
+    Save state (if given) and upload the generated files to a city folder in parallel.
+    State is appended to the city's change log as a diff against state_base.
+    files are local paths (always uploaded as new files); blobs are in-memory
+    (filename, bytes, mimetype[, content_key]) tuples synced by content hash, so
+    unchanged blobs are skipped and changed ones are updated in place.
+    Results are keyed by "state.json" and by each file name.
+    """
+    tasks = []
+    if state is not None:
+        tasks.append(UploadTask("state.json", save_state_changes, (folder_id, state), {"base_state": state_base}))
+    for path in files:
+        tasks.append(UploadTask(os.path.basename(path), upload_file_to_folder, (path, folder_id),
+                                {"make_public": make_public}))
+    for blob in blobs:
+        filename, data, mimetype = blob[:3]
+        content_key = blob[3] if len(blob) > 3 else None
+        tasks.append(UploadTask(filename, sync_bytes, (folder_id, filename, data, mimetype),
+                                {"content_key": content_key, "make_public": make_public}))
+    return run_uploads(tasks, folder_id=folder_id, max_workers=max_workers)